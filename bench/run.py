@@ -0,0 +1,269 @@
+"""
+The bot's benchmark. This replays a synthetic message stream through
+automatic translation against stub DeepL and Discord servers, and
+reports throughput, latency, API calls and memory.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CWD = os.getcwd()
+sys.path[:0] = [ROOT, os.path.join(ROOT, "src"), os.path.dirname(os.path.abspath(__file__))]
+# the bot expects to be run from src/, where the constants find .env and exts/.
+os.chdir(os.path.join(ROOT, "src"))
+
+import interactions as i
+import stubs
+from interactions.api.http.client import HTTPClient
+from interactions.api.http.route import Route
+
+import src.const
+import src.model
+
+log = logging.getLogger("bench")
+
+LANGUAGES = ["DE", "ES", "FR", "JA"]
+WORDS = (
+    "the quick brown fox jumps over a lazy dog while we wait for the train to arrive "
+    "and talk about what happened at work today before going home for dinner"
+).split()
+
+
+def distribution(spec: str):
+    """Parses a message size such as ``fixed:120``, ``uniform:20,400`` or ``lognormal:4.5,0.8``."""
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(",") if value]
+
+    match kind, values:
+        case "fixed", [size]:
+            return lambda: int(size)
+        case "uniform", [low, high]:
+            return lambda: int(random.uniform(low, high))
+        case "lognormal", [mu, sigma]:
+            return lambda: int(random.lognormvariate(mu, sigma))
+
+    raise argparse.ArgumentTypeError(f"{spec!r} is not a size distribution.")
+
+
+def override(spec: str) -> tuple[str, str]:
+    name, sep, value = spec.partition("=")
+
+    if not sep or not hasattr(src.const, name):
+        raise argparse.ArgumentTypeError(f"{spec!r} is not NAME=VALUE of a known constant.")
+
+    return name, value
+
+
+def text(token: str, size: int) -> str:
+    """Makes a message of about ``size`` characters carrying a token to find it by."""
+    words = [token]
+
+    while sum(len(word) + 1 for word in words) < size:
+        words.append(random.choice(WORDS))
+
+    return " ".join(words).capitalize()
+
+
+def payload(id: int, author: dict, channel_id: int, guild_id: int, content: str) -> dict:
+    return {
+        "id": str(id),
+        "type": 0,
+        "channel_id": str(channel_id),
+        "guild_id": str(guild_id),
+        "author": author,
+        "content": content,
+        "timestamp": "2022-07-02T00:00:00+00:00",
+        "tts": False,
+        "mention_everyone": False,
+        "mentions": [],
+        "mention_roles": [],
+        "attachments": [],
+        "embeds": [],
+        "pinned": False,
+    }
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+
+    values = sorted(values)
+    return values[min(len(values) - 1, math.ceil(q * len(values)) - 1)]
+
+
+async def bench(args: argparse.Namespace) -> dict:
+    random.seed(args.seed)
+    deepl_stub = stubs.DeepLStub(
+        stubs.Fault(args.deepl_latency, args.deepl_jitter, args.deepl_429, args.retry_after)
+    )
+    discord_stub = stubs.DiscordStub(
+        stubs.Fault(args.discord_latency, args.discord_jitter, args.discord_429, args.retry_after)
+    )
+    workdir = tempfile.TemporaryDirectory(prefix="disword-bench-")
+
+    src.const.SERVER_URL = await deepl_stub.start()
+    src.const.AUTH_KEY = "bench"
+    src.const.STORAGE = "sqlite"
+    src.const.DATABASE = os.path.join(workdir.name, "disword.sqlite3")
+    src.const.CACHE_PATH = None
+    src.const.SNAPSHOT_PATH = None
+    for name, value in args.set:
+        setattr(src.const, name, type(getattr(src.const, name) or "")(value))
+    Route.__api__ = f"{await discord_stub.start()}/api/v10"
+
+    bot = i.Client(token="bench")
+    # the client only sets up its HTTP client when it logs in.
+    bot._http = HTTPClient("bench")
+    bot.load("exts.translate")
+    ext = bot._extensions["Translate"]
+    logging.getLogger().setLevel(args.log_level)
+
+    authors = [
+        {
+            "id": str(10**16 + n),
+            "username": f"user{n}",
+            "discriminator": "0001",
+            "avatar": None,
+            "bot": False,
+        }
+        for n in range(args.users)
+    ]
+    for author in authors:
+        ext.store.set_user(src.model.TranslationUser(int(author["id"]), random.choice(LANGUAGES)))
+    await ext._start_store()
+
+    size = args.size
+    sent: dict[str, float] = {}
+    tasks: list[asyncio.Task] = []
+    interval = 1 / args.rate if args.rate else 0
+
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    started = time.monotonic()
+
+    for n in range(args.messages):
+        user = random.randrange(args.users)
+        guild_id = 1000 + user % args.guilds
+        channel_id = guild_id * 100 + random.randrange(args.channels)
+        token = f"msg{n}"
+        message = i.Message(
+            **payload(10**17 + n, authors[user], channel_id, guild_id, text(token, size())),
+            _client=bot._http,
+        )
+        sent[token] = time.monotonic()
+        tasks.append(asyncio.create_task(ext._convert_auto_translate(message)))
+
+        if interval:
+            await asyncio.sleep(max(0.0, started + (n + 1) * interval - time.monotonic()))
+
+    await asyncio.gather(*tasks, return_exceptions=True)
+    deadline = time.monotonic() + args.timeout
+
+    while ext.delivery.depth and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+
+    finished = time.monotonic()
+    latencies = []
+
+    for arrived, content in discord_stub.executed:
+        for word in content.lower().split():
+            if word in sent:
+                latencies.append(arrived - sent.pop(word))
+                break
+
+    delivered = len(latencies)
+    report = {
+        "messages": args.messages,
+        "delivered": delivered,
+        "shed": args.messages - delivered,
+        "seconds": round(finished - started, 3),
+        "throughput": round(delivered / (finished - started), 2) if delivered else 0.0,
+        "latency_p50": percentile(latencies, 0.50),
+        "latency_p95": percentile(latencies, 0.95),
+        "latency_p99": percentile(latencies, 0.99),
+        "latency_mean": statistics.fmean(latencies) if latencies else None,
+        "deepl_calls": sum(deepl_stub.calls.values()),
+        "deepl_calls_per_message": sum(deepl_stub.calls.values()) / args.messages,
+        "deepl_characters": deepl_stub.characters,
+        "deepl_429": deepl_stub.limited,
+        "discord_calls": sum(discord_stub.calls.values()),
+        "discord_calls_per_message": sum(discord_stub.calls.values()) / args.messages,
+        "discord_429": discord_stub.limited,
+        "deleted": discord_stub.deleted,
+        "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+    if args.tracemalloc:
+        report["traced_peak_kib"] = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+
+    await ext.services.close()
+    await bot._http._req.close()
+    await deepl_stub.close()
+    await discord_stub.close()
+    workdir.cleanup()
+    return report
+
+
+def compare(report: dict, path: str):
+    with open(path, "r") as f:
+        baseline = json.load(f)
+
+    for key, value in report.items():
+        before = baseline.get(key)
+
+        if isinstance(value, (int, float)) and isinstance(before, (int, float)) and before:
+            change = (value - before) / before
+            print(f"{key:>28}: {before:>12.4g} -> {value:<12.4g} ({change:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks automatic translation offline.")
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument(
+        "--rate", type=float, default=100.0, help="messages per second, 0 for all at once"
+    )
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--guilds", type=int, default=10)
+    parser.add_argument("--channels", type=int, default=3, help="channels per guild")
+    parser.add_argument("--size", type=distribution, default="lognormal:4.5,0.8")
+    parser.add_argument("--deepl-latency", type=float, default=0.15)
+    parser.add_argument("--deepl-jitter", type=float, default=0.05)
+    parser.add_argument("--deepl-429", type=float, default=0.0)
+    parser.add_argument("--discord-latency", type=float, default=0.08)
+    parser.add_argument("--discord-jitter", type=float, default=0.02)
+    parser.add_argument("--discord-429", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.5)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--set", type=override, action="append", default=[], metavar="NAME=VALUE")
+    parser.add_argument("--tracemalloc", action="store_true")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", help="where to write the report as JSON")
+    parser.add_argument("--compare", help="a previous report to compare against")
+    args = parser.parse_args()
+
+    report = asyncio.run(bench(args))
+    print(json.dumps(report, indent=4))
+
+    if args.output:
+        with open(os.path.join(CWD, args.output), "w") as f:
+            json.dump(report, f, indent=4)
+    if args.compare:
+        compare(report, os.path.join(CWD, args.compare))
+
+
+if __name__ == "__main__":
+    main()
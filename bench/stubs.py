@@ -0,0 +1,250 @@
+"""
+The benchmark's stub servers. These stand in for the DeepL API
+and Discord's REST and webhook endpoints on localhost.
+"""
+import asyncio
+import collections
+import itertools
+import json
+import random
+import time
+
+import attrs
+from aiohttp import web
+
+
+@attrs.define()
+class Fault:
+    """Represents the latency and rate limits a stub server injects."""
+
+    latency: float = attrs.field(default=0.0)
+    """The mean latency of a response, in seconds."""
+    jitter: float = attrs.field(default=0.0)
+    """The standard deviation of the latency, in seconds."""
+    rate_limit: float = attrs.field(default=0.0)
+    """The chance of a request being answered with a 429."""
+    retry_after: float = attrs.field(default=0.1)
+    """The ``Retry-After`` given with a 429, in seconds."""
+
+    async def delay(self):
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+
+    def limited(self) -> bool:
+        return random.random() < self.rate_limit
+
+
+class Stub:
+    """A stub server counting the requests made to each of its routes."""
+
+    def __init__(self, fault: Fault | None = None):
+        self.fault = fault or Fault()
+        self.calls: collections.Counter[str] = collections.Counter()
+        self.limited = 0
+        self.app = web.Application(middlewares=[self._middleware])
+        self._runner: web.AppRunner | None = None
+        self.url: str | None = None
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        self.calls[request.match_info.route.resource.canonical] += 1
+        await self.fault.delay()
+
+        if self.fault.limited():
+            self.limited += 1
+            return self._rate_limited()
+
+        return await handler(request)
+
+    def _rate_limited(self) -> web.Response:
+        return web.Response(status=429, headers={"Retry-After": str(self.fault.retry_after)})
+
+    async def start(self) -> str:
+        """Starts serving on a free local port, returning the URL to reach it."""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+class DeepLStub(Stub):
+    """
+    A stub of the DeepL API.
+
+    Translations are the text prefixed with the target language, detected
+    as English, and every character sent is counted towards the usage.
+    """
+
+    LANGUAGES = [
+        {"language": "DE", "name": "German", "supports_formality": True},
+        {"language": "EN-GB", "name": "English (British)", "supports_formality": False},
+        {"language": "EN-US", "name": "English (American)", "supports_formality": False},
+        {"language": "ES", "name": "Spanish", "supports_formality": True},
+        {"language": "FR", "name": "French", "supports_formality": True},
+        {"language": "JA", "name": "Japanese", "supports_formality": False},
+    ]
+
+    def __init__(self, fault: Fault | None = None):
+        super().__init__(fault)
+        self.characters = 0
+        self.texts = 0
+        self.app.router.add_post("/v2/translate", self.translate)
+        self.app.router.add_route("*", "/v2/usage", self.usage)
+        self.app.router.add_route("*", "/v2/languages", self.languages)
+
+    async def _params(self, request: web.Request) -> dict[str, list[str]]:
+        if request.content_type == "application/json":
+            data = await request.json()
+            return {
+                key: value if isinstance(value, list) else [value] for key, value in data.items()
+            }
+
+        data = await request.post()
+        return {key: data.getall(key) for key in data}
+
+    async def translate(self, request: web.Request) -> web.Response:
+        params = await self._params(request)
+        target = params["target_lang"][0].upper()
+        texts = params["text"]
+        self.texts += len(texts)
+        self.characters += sum(len(text) for text in texts)
+        return web.json_response(
+            {
+                "translations": [
+                    {
+                        "detected_source_language": "EN",
+                        "text": f"[{target}] {text}",
+                        "billed_characters": len(text),
+                    }
+                    for text in texts
+                ]
+            }
+        )
+
+    async def usage(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {"character_count": self.characters, "character_limit": 1_000_000_000}
+        )
+
+    async def languages(self, request: web.Request) -> web.Response:
+        return web.json_response(self.LANGUAGES)
+
+
+class DiscordStub(Stub):
+    """
+    A stub of the Discord REST API for webhooks and message deletes.
+
+    Every webhook message executed is recorded with when it arrived, so
+    the benchmark can match it to the message it translates.
+    """
+
+    def __init__(self, fault: Fault | None = None):
+        super().__init__(fault)
+        self.executed: list[tuple[float, str]] = []
+        self.deleted = 0
+        self._ids = itertools.count(10**17)
+        self._webhooks: dict[int, dict] = {}
+        self.app.router.add_get("/api/v10/channels/{channel_id}/webhooks", self.channel_webhooks)
+        self.app.router.add_post("/api/v10/channels/{channel_id}/webhooks", self.create_webhook)
+        self.app.router.add_get("/api/v10/webhooks/{webhook_id}", self.get_webhook)
+        self.app.router.add_post("/api/v10/webhooks/{webhook_id}/{token}", self.execute_webhook)
+        self.app.router.add_delete(
+            "/api/v10/channels/{channel_id}/messages/{message_id}", self.delete_message
+        )
+        self.app.router.add_post(
+            "/api/v10/channels/{channel_id}/messages/bulk-delete", self.bulk_delete
+        )
+
+    def _rate_limited(self) -> web.Response:
+        return web.json_response(
+            {"message": "You are being rate limited.", "retry_after": self.fault.retry_after},
+            status=429,
+            headers={
+                "Retry-After": str(self.fault.retry_after),
+                "X-RateLimit-Remaining": "0",
+                "X-RateLimit-Reset-After": str(self.fault.retry_after),
+            },
+        )
+
+    async def channel_webhooks(self, request: web.Request) -> web.Response:
+        channel_id = request.match_info["channel_id"]
+        return web.json_response(
+            [data for data in self._webhooks.values() if data["channel_id"] == channel_id]
+        )
+
+    async def create_webhook(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        id = next(self._ids)
+        self._webhooks[id] = {
+            "id": str(id),
+            "type": 1,
+            "channel_id": request.match_info["channel_id"],
+            "name": data.get("name"),
+            "avatar": None,
+            "token": f"token-{id}",
+            "application_id": None,
+        }
+        return web.json_response(self._webhooks[id])
+
+    async def get_webhook(self, request: web.Request) -> web.Response:
+        if (data := self._webhooks.get(int(request.match_info["webhook_id"]))) is None:
+            return web.json_response({"message": "Unknown Webhook", "code": 10015}, status=404)
+
+        return web.json_response(data)
+
+    async def execute_webhook(self, request: web.Request) -> web.Response:
+        if request.content_type == "application/json":
+            data = await request.json()
+        elif request.content_type.startswith("multipart/"):
+            # newer clients send the message as a payload_json form field.
+            data = json.loads((await request.post()).get("payload_json") or "{}")
+        else:
+            data = {}
+
+        content = data.get("content", "")
+        self.executed.append((time.monotonic(), content))
+        webhook = self._webhooks.get(int(request.match_info["webhook_id"]), {})
+
+        # like Discord, only answer with the message when asked to wait for it.
+        if request.query.get("wait", "false").lower() != "true":
+            return web.Response(status=204)
+
+        return web.json_response(
+            {
+                "id": str(next(self._ids)),
+                "type": 0,
+                "channel_id": webhook.get("channel_id"),
+                "content": content,
+                "author": {
+                    "id": request.match_info["webhook_id"],
+                    "username": data.get("username", "Disword"),
+                    "discriminator": "0000",
+                    "avatar": None,
+                    "bot": True,
+                },
+                "webhook_id": request.match_info["webhook_id"],
+                "timestamp": "2022-07-02T00:00:00+00:00",
+                "tts": False,
+                "mention_everyone": False,
+                "mentions": [],
+                "mention_roles": [],
+                "attachments": [],
+                "embeds": [],
+                "pinned": False,
+            }
+        )
+
+    async def delete_message(self, request: web.Request) -> web.Response:
+        self.deleted += 1
+        return web.Response(status=204)
+
+    async def bulk_delete(self, request: web.Request) -> web.Response:
+        self.deleted += len((await request.json()).get("messages", []))
+        return web.Response(status=204)
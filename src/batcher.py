@@ -0,0 +1,101 @@
+"""
+The bot's translation batcher. This coalesces automatic
+translations so one API call serves many messages.
+"""
+import asyncio
+import logging
+
+import deepl
+
+import src.markup
+import src.quota
+import src.translator
+
+log = logging.getLogger(__name__)
+
+Group = tuple[str, str | None]
+# a text waiting in a batch, the future of its result and who pays for it.
+Job = tuple[str, asyncio.Future, tuple[int | None, int | None]]
+
+
+class TranslationBatcher:
+    """
+    A micro-batching stage in front of the translator.
+
+    Texts submitted for the same target language and formality are held
+    for up to ``window`` seconds, or until ``size`` of them are waiting,
+    and are then translated with a single API call. Each caller gets the
+    result of its own text back, in the order the texts were submitted.
+    Texts are expected to be segmented, with their markup as placeholders.
+    When a ``ledger`` is given, what each text was billed for is recorded
+    for whoever was paying when it was submitted.
+    """
+
+    def __init__(
+        self,
+        translator: src.translator.AsyncTranslator,
+        window: float = 0.05,
+        size: int = 50,
+        ledger: src.quota.QuotaLedger | None = None,
+    ):
+        self.translator = translator
+        self.window = window
+        self.size = size
+        self.ledger = ledger
+        self._pending: dict[Group, list[Job]] = {}
+        self._timers: dict[Group, asyncio.TimerHandle] = {}
+
+    def __len__(self) -> int:
+        return sum(len(jobs) for jobs in self._pending.values())
+
+    async def translate(
+        self, text: str, target_lang: str, formality: str | None = None
+    ) -> deepl.TextResult:
+        """Translates a text as part of the next batch for its language and formality."""
+        loop = asyncio.get_running_loop()
+        group: Group = (target_lang.upper(), formality)
+        future = loop.create_future()
+        jobs = self._pending.setdefault(group, [])
+        jobs.append((text, future, src.quota.PAYER.get()))
+
+        if len(jobs) >= self.size:
+            self._flush(group)
+        elif group not in self._timers:
+            self._timers[group] = loop.call_later(self.window, self._flush, group)
+
+        return await future
+
+    def _flush(self, group: Group):
+        if timer := self._timers.pop(group, None):
+            timer.cancel()
+
+        if jobs := self._pending.pop(group, None):
+            asyncio.get_running_loop().create_task(self._send(group, jobs))
+
+    async def _send(self, group: Group, jobs: list[Job]):
+        target_lang, formality = group
+        kwargs = {"target_lang": target_lang, **src.markup.OPTIONS}
+
+        if formality:
+            kwargs["formality"] = formality
+
+        try:
+            results = await self.translator.translate_text([text for text, *_ in jobs], **kwargs)
+        except Exception as error:
+            for _, future, _ in jobs:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        log.debug(f"Translated a batch of {len(jobs)} texts to {target_lang}.")
+
+        for (_, future, payer), result in zip(jobs, results):
+            if self.ledger is not None and result.billed_characters:
+                self.ledger.record(result.billed_characters, *payer)
+            if not future.done():
+                future.set_result(result)
+
+    def close(self):
+        """Flushes every waiting batch right away."""
+        for group in list(self._pending):
+            self._flush(group)
@@ -1,21 +1,62 @@
 """
 The bot runner file. This configures an instance of the bot
 and runs it with the appropriate extensions.
+
+Run it with ``--startup-time`` to log how long each phase of
+starting up took once the bot is ready, and with ``--shard`` and
+``--shards`` to run as one of several shards (see ``shards.py``).
 """
+import asyncio
 import logging
+import signal
 import sys
+import time
+
+started = time.perf_counter()
 
 import interactions
 
 sys.path.append("..")
 
-import const
+import src.const
+import src.logs
+import src.metrics
+import src.services
+import src.shards
 
-logging.basicConfig(level=logging.DEBUG)
+shard, shards = src.shards.parse(sys.argv[1:])
+src.logs.setup(
+    src.const.LOG_LEVEL,
+    src.logs.parse(src.const.LOG_LEVELS),
+    format=src.const.LOG_FORMAT,
+    size=src.const.LOG_QUEUE,
+    burst=src.const.LOG_BURST,
+    window=src.const.LOG_WINDOW,
+    sample=src.const.LOG_SAMPLE,
+    **({"shard": shard} if shards > 1 else {}),
+)
 log = logging.getLogger()
+src.metrics.Trace.enabled = src.const.TRACE
+# every shard serves its own metrics, on the next port along.
+metrics = src.metrics.MetricsServer(
+    host=src.const.METRICS_HOST, port=src.const.METRICS_PORT + shard
+)
+health = src.shards.Health(src.const.DATABASE) if shards > 1 else None
+startup = src.metrics.REGISTRY.gauge(
+    "disword_startup_seconds", "How long each phase of starting up took.", ["phase"]
+)
+startup.set(time.perf_counter() - started, phase="imports")
 
 bot = interactions.Client(
-    const.TOKEN, intents=interactions.Intents.DEFAULT | interactions.Intents.GUILD_MESSAGE_CONTENT
+    src.const.TOKEN,
+    intents=interactions.Intents.DEFAULT | interactions.Intents.GUILD_MESSAGE_CONTENT,
+    **({"shards": [shard, shards]} if shards > 1 else {}),
+)
+src.metrics.REGISTRY.gauge(
+    "disword_gateway_latency_seconds",
+    "How long the last gateway heartbeat took to be acknowledged.",
+    ["shard"],
+    function=lambda: {(str(shard),): bot.latency / 1000},
 )
 bot.change_presence(
     interactions.ClientPresence(
@@ -28,42 +69,69 @@ bot.change_presence(
         status=interactions.StatusType.ONLINE,
     )
 )
+services = src.services.Services(shard, shards)
+loading = time.perf_counter()
 bot.load("exts.help")
 bot.load("interactions.ext.enhanced")
 bot.load("interactions.ext.files")
-[bot.load(f"exts.{ext}") for ext in const.EXTENSIONS if ext != "help"]
+[bot.load(f"exts.{ext}", services=services) for ext in src.const.EXTENSIONS if ext != "help"]
+startup.set(time.perf_counter() - loading, phase="extensions")
 
 
 @bot.event
 async def on_ready():
-    log.debug(f"Disword is online.\n> {bot.latency}ms\n> {len(bot.guilds)} guilds")
-
-
-@bot.command(name="eval")
-async def _eval(ctx: interactions.CommandContext):
-    """Evaluates and executes given code on the running bot instance."""
-    modal = interactions.Modal(
-        title="Eval",
-        custom_id="eval",
-        components=[
-            interactions.TextInput(
-                style=interactions.TextStyleType.PARAGRAPH,
-                label="Code",
-                placeholder='print("hello world")',
-                custom_id="eval_code",
-            ),
-        ],
+    startup.set(time.perf_counter() - started, phase="ready")
+
+    if src.const.METRICS_PORT:
+        await metrics.start()
+    if "--startup-time" in sys.argv:
+        phases = startup.values()
+        log.info(
+            f"Started up in {phases['ready',]:.3f}s: imports {phases['imports',]:.3f}s, "
+            f"extensions {phases['extensions',]:.3f}s."
+        )
+
+    if health is not None:
+        health.start(bot, shard)
+
+    log.info(
+        f"Disword is online as shard {shard}/{shards}.\n"
+        f"> {bot.latency}ms\n> {len(bot.guilds)} guilds"
     )
-    if int(ctx.author.id) == 242351388137488384:
-        await ctx.popup(modal)
-    else:
-        await ctx.send(":x: You are not allowed to use this command.", ephemeral=True)
 
 
-@bot.modal("eval")
-async def _eval_callback(ctx: interactions.CommandContext, eval_code: str = ""):
-    eval(eval_code)
-    await ctx.send(":heavy_check_mark: Response has been triggered.", ephemeral=True)
+async def shutdown():
+    """Closes the services, and everything the extensions keep, once."""
+    global closed
+
+    if closed:
+        return
+
+    closed = True
+
+    if health is not None:
+        health.close()
+
+    await metrics.close()
+    await services.close()
+
+
+def terminate(signum: int):
+    """Shuts down on a signal, since the interpreter skips its exit hooks on SIGTERM."""
+    log.info(f"Received {signal.Signals(signum).name}, shutting down.")
+    asyncio.ensure_future(shutdown(), loop=bot._loop).add_done_callback(lambda _: bot._loop.stop())
+
+
+closed = False
 
+for signum in (signal.SIGINT, signal.SIGTERM):
+    bot._loop.add_signal_handler(signum, terminate, signum)
 
-bot.start()
+try:
+    bot.start()
+except RuntimeError:
+    # stopping the loop from a signal interrupts the client mid-run.
+    if not closed:
+        raise
+finally:
+    bot._loop.run_until_complete(shutdown())
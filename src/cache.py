@@ -0,0 +1,196 @@
+"""
+The bot's translation cache. This remembers recent translations
+so repeated phrases never reach the DeepL API twice.
+"""
+import asyncio
+import collections
+import concurrent.futures
+import logging
+import sqlite3
+import time
+import typing
+import unicodedata
+
+import attrs
+
+log = logging.getLogger(__name__)
+
+Key = tuple[str, str, str]
+
+
+def make_key(text: str, target_lang: str, formality: str | None = None) -> Key:
+    """Makes the cache key of a translation from its normalized text and options."""
+    return (
+        unicodedata.normalize("NFC", text.strip()),
+        target_lang.upper(),
+        str(formality or "default").lower(),
+    )
+
+
+@attrs.define()
+class CacheStats:
+    """Represents the counters of a translation cache."""
+
+    hits: int = attrs.field(default=0)
+    """How many lookups were answered by the cache."""
+    misses: int = attrs.field(default=0)
+    """How many lookups had to go to the API."""
+    evicted: int = attrs.field(default=0)
+    """How many entries were dropped for being the least recently used."""
+    expired: int = attrs.field(default=0)
+    """How many entries were dropped for being too old."""
+    saved: int = attrs.field(default=0)
+    """How many billed characters the hits have saved."""
+
+    @property
+    def hit_rate(self) -> float:
+        """The share of lookups answered by the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class TranslationCache:
+    """
+    A bounded LRU cache of translations with a time to live.
+
+    At most ``size`` entries are kept in memory, each for ``ttl`` seconds.
+    When ``path`` is given, entries are also written to an SQLite file that
+    survives restarts and is consulted on a memory miss. Disk access runs
+    on its own thread so lookups never block the loop.
+    """
+
+    def __init__(self, size: int = 4096, ttl: float = 86400.0, path: str | None = None):
+        self.size = size
+        self.ttl = ttl
+        self.path = path
+        self.stats = CacheStats()
+        self._entries: collections.OrderedDict[
+            Key, tuple[str, str, float]
+        ] = collections.OrderedDict()
+        self._db: sqlite3.Connection | None = None
+        self._executor: concurrent.futures.ThreadPoolExecutor | None = None
+        self._pending: typing.Callable[[], list | None] | None = None
+
+        if path is not None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="cache"
+            )
+            self._executor.submit(self._open).result()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _open(self):
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        # every shard's process may share the same file.
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            "text TEXT, target TEXT, formality TEXT, result TEXT, source TEXT, created REAL, "
+            "PRIMARY KEY (text, target, formality))"
+        )
+        self._db.execute("DELETE FROM translations WHERE created < ?", (time.time() - self.ttl,))
+        self._db.commit()
+
+    def _disk_get(self, key: Key) -> tuple[str, str, float] | None:
+        return self._db.execute(
+            "SELECT result, source, created FROM translations "
+            "WHERE text = ? AND target = ? AND formality = ?",
+            key,
+        ).fetchone()
+
+    def _disk_put(self, key: Key, value: tuple[str, str, float]):
+        self._db.execute(
+            "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?, ?)", (*key, *value)
+        )
+        self._db.commit()
+
+    def _remember(self, key: Key, value: tuple[str, str, float]):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+            self.stats.evicted += 1
+
+    def restore(self, load: typing.Callable[[], list | None]):
+        """Restores the entries of a snapshot, once the cache is first used."""
+        self._pending = load
+
+    def _restore(self):
+        load, self._pending = self._pending, None
+        expired = time.time() - self.ttl
+        # what the snapshot holds is older than anything remembered since.
+        entries = collections.OrderedDict(
+            (key, value)
+            for key, value in load() or ()
+            if value[2] >= expired and key not in self._entries
+        )
+        entries.update(self._entries)
+        self._entries = entries
+
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+        log.debug(f"Restored {len(self._entries)} translations from the snapshot.")
+
+    def dump(self) -> list[tuple[Key, tuple[str, str, float]]]:
+        """Dumps every entry, least recently used first."""
+        if self._pending is not None:
+            self._restore()
+
+        return list(self._entries.items())
+
+    def get_nowait(self, key: Key) -> tuple[str, str] | None:
+        """Gets a translation as ``(text, detected_source_lang)`` from memory only."""
+        if self._pending is not None:
+            self._restore()
+
+        if (value := self._entries.get(key)) is None:
+            return None
+
+        if value[2] + self.ttl < time.time():
+            del self._entries[key]
+            self.stats.expired += 1
+            return None
+
+        self._entries.move_to_end(key)
+        return value[0], value[1]
+
+    async def get(self, key: Key) -> tuple[str, str] | None:
+        """Gets a translation as ``(text, detected_source_lang)``, counting the hit or miss."""
+        result = self.get_nowait(key)
+
+        if result is None and self._executor is not None:
+            loop = asyncio.get_running_loop()
+            value = await loop.run_in_executor(self._executor, self._disk_get, key)
+
+            if value is not None and value[2] + self.ttl >= time.time():
+                self._remember(key, value)
+                result = value[0], value[1]
+
+        if result is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+            self.stats.saved += len(key[0])
+
+        return result
+
+    def put(self, key: Key, text: str, source: str):
+        """Remembers a translation, writing it behind to disk if enabled."""
+        if self._pending is not None:
+            self._restore()
+
+        value = (text, source, time.time())
+        self._remember(key, value)
+
+        if self._executor is not None:
+            self._executor.submit(self._disk_put, key, value)
+
+    def close(self):
+        """Waits for pending disk writes and closes the disk tier."""
+        if self._executor is not None:
+            self._executor.submit(self._db.close)
+            self._executor.shutdown(wait=True)
+            self._executor = None
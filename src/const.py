@@ -6,6 +6,48 @@ import os
 
 import dotenv
 
-TOKEN = dotenv.get_key("../.env", "BOT_TOKEN")
-AUTH_KEY = dotenv.get_key("../.env", "DEEPL_TOKEN")
-EXTENSIONS = [file.replace(".py", "") for file in os.listdir("exts") if not file.startswith("_")]
+# the .env file is parsed once here, instead of once per constant.
+_env = dotenv.dotenv_values("../.env")
+
+TOKEN = _env.get("BOT_TOKEN")
+OWNER_ID = int(_env.get("OWNER_ID") or 242351388137488384)
+AUTH_KEY = _env.get("DEEPL_TOKEN")
+SERVER_URL = _env.get("DEEPL_SERVER_URL") or None
+CONCURRENCY = int(_env.get("DEEPL_CONCURRENCY") or 8)
+TIMEOUT = float(_env.get("DEEPL_TIMEOUT") or 10)
+BATCH_WINDOW = float(_env.get("BATCH_WINDOW") or 0.05)
+BATCH_SIZE = int(_env.get("BATCH_SIZE") or 50)
+DOCUMENT_LIMIT = int(_env.get("DOCUMENT_LIMIT") or 10485760)
+QUOTA_SOFT = float(_env.get("QUOTA_SOFT") or 0.9)
+QUOTA_HARD = float(_env.get("QUOTA_HARD") or 0.98)
+SCHEDULER_RATE = float(_env.get("SCHEDULER_RATE") or 10)
+SCHEDULER_BURST = int(_env.get("SCHEDULER_BURST") or 20)
+SCHEDULER_QUEUE = int(_env.get("SCHEDULER_QUEUE") or 50)
+STORAGE = _env.get("STORAGE") or "json"
+DATABASE = _env.get("DATABASE") or "./db/disword.sqlite3"
+CACHE_SIZE = int(_env.get("CACHE_SIZE") or 4096)
+CACHE_TTL = float(_env.get("CACHE_TTL") or 86400)
+CACHE_PATH = _env.get("CACHE_PATH") or None
+MESSAGE_CACHE_SIZE = int(_env.get("MESSAGE_CACHE_SIZE") or 200)
+MESSAGE_CACHE_AGE = float(_env.get("MESSAGE_CACHE_AGE") or 3600)
+MESSAGE_CACHE_LIMIT = int(_env.get("MESSAGE_CACHE_LIMIT") or 8388608)
+SNAPSHOT_PATH = _env.get("SNAPSHOT_PATH") or None
+SNAPSHOT_INTERVAL = float(_env.get("SNAPSHOT_INTERVAL") or 300)
+METRICS_HOST = _env.get("METRICS_HOST") or "127.0.0.1"
+METRICS_PORT = int(_env.get("METRICS_PORT") or 0)
+SHARDS = int(_env.get("SHARDS") or 1)
+LOG_LEVEL = _env.get("LOG_LEVEL") or "INFO"
+LOG_LEVELS = _env.get("LOG_LEVELS") or ""
+LOG_FORMAT = _env.get("LOG_FORMAT") or "text"
+LOG_QUEUE = int(_env.get("LOG_QUEUE") or 10000)
+LOG_BURST = int(_env.get("LOG_BURST") or 10)
+LOG_WINDOW = float(_env.get("LOG_WINDOW") or 60)
+LOG_SAMPLE = int(_env.get("LOG_SAMPLE") or 100)
+TRACE = (_env.get("TRACE") or "").lower() in ("1", "true", "yes")
+EXTENSIONS = [
+    extension.strip()
+    for extension in (
+        _env.get("EXTENSIONS") or ",".join(file.removesuffix(".py") for file in os.listdir("exts"))
+    ).split(",")
+    if extension.strip() and not extension.startswith("_")
+]
@@ -0,0 +1,230 @@
+"""
+The bot's delivery queue. This sends translated messages through
+channel webhooks in the order the original messages arrived.
+"""
+import asyncio
+import collections
+import logging
+import time
+import typing
+
+import attrs
+import interactions as i
+
+import src.metrics
+import src.webhooks
+
+log = logging.getLogger(__name__)
+
+
+@attrs.define()
+class Delivery:
+    """Represents a translated message waiting to be sent to a channel."""
+
+    channel_id: int = attrs.field()
+    """The ID of the channel to send to."""
+    message_id: int | None = attrs.field(default=None)
+    """The ID of the original message to delete once sent, if any."""
+    source_id: int | None = attrs.field(default=None)
+    """The ID of the original message translated alongside, to edit along with it."""
+    source: str | None = attrs.field(default=None)
+    """The content of that original message, as last translated."""
+    content: str | None = attrs.field(default=None)
+    """The content to send."""
+    kwargs: dict = attrs.field(factory=dict)
+    """Other options to execute the webhook with."""
+    created: float = attrs.field(factory=time.monotonic)
+    """When the delivery was reserved."""
+    ready: asyncio.Future = attrs.field(factory=lambda: asyncio.get_running_loop().create_future())
+    """Resolved with whether to send once the delivery is fulfilled or cancelled."""
+    sent: asyncio.Future = attrs.field(factory=lambda: asyncio.get_running_loop().create_future())
+    """Resolved with the message sent, or ``None`` if nothing was."""
+    edited: typing.Any = attrs.field(default=None)
+    """When the original message was last edited, as far as the edits sent know."""
+
+
+class DeliveryQueue:
+    """
+    An ordered outbound queue of webhook messages per channel.
+
+    A delivery is reserved as soon as a message arrives, and is sent only
+    once every delivery reserved before it in the channel has been sent or
+    cancelled. One webhook call is in flight per channel, which keeps each
+    webhook within its rate-limit bucket while the library's limiter paces
+    the rest. Deletes of the original messages run alongside and are
+    coalesced into bulk deletes whenever several are waiting.
+
+    Deliveries sent alongside an original message are remembered for the
+    last ``posts`` originals, so an edit of the original can edit them too.
+    """
+
+    BULK = 100
+
+    def __init__(
+        self,
+        bot: i.Client,
+        webhooks: src.webhooks.WebhookPool,
+        latencies: int = 1000,
+        posts: int = 1000,
+    ):
+        self.bot = bot
+        self.webhooks = webhooks
+        self.latencies: collections.deque[float] = collections.deque(maxlen=latencies)
+        self.posts = posts
+        self._posts: collections.OrderedDict[int, Delivery] = collections.OrderedDict()
+        self._queues: dict[int, collections.deque[Delivery]] = {}
+        self._deletes: dict[int, list[int]] = {}
+        self._workers: dict[int, asyncio.Task] = {}
+        self._deleters: dict[int, asyncio.Task] = {}
+
+    @property
+    def depth(self) -> int:
+        """How many deliveries are waiting across every channel."""
+        return sum(len(queue) for queue in self._queues.values())
+
+    def reserve(
+        self,
+        channel_id: int,
+        message_id: int | None = None,
+        source_id: int | None = None,
+        source: str | None = None,
+    ) -> Delivery:
+        """Reserves the next place in a channel's queue."""
+        delivery = Delivery(channel_id, message_id, source_id, source)
+        self._queues.setdefault(channel_id, collections.deque()).append(delivery)
+
+        if source_id is not None:
+            self._posts[source_id] = delivery
+
+            while len(self._posts) > self.posts:
+                self._posts.popitem(last=False)
+
+        if channel_id not in self._workers:
+            self._workers[channel_id] = asyncio.get_running_loop().create_task(
+                self._work(channel_id)
+            )
+
+        return delivery
+
+    def fulfil(self, delivery: Delivery, content: str, **kwargs):
+        """Gives a reserved delivery its content, letting it be sent when its turn comes."""
+        if not delivery.ready.done():
+            delivery.content = content
+            delivery.kwargs = kwargs
+            delivery.ready.set_result(True)
+
+    def cancel(self, delivery: Delivery):
+        """Gives up a reserved delivery. This does nothing once it has been fulfilled."""
+        if not delivery.ready.done():
+            delivery.ready.set_result(False)
+
+    def send(self, channel_id: int, content: str, **kwargs) -> Delivery:
+        """Queues a message with nothing to wait for or delete."""
+        delivery = self.reserve(channel_id)
+        self.fulfil(delivery, content, **kwargs)
+        return delivery
+
+    async def posted(self, source_id: int) -> Delivery | None:
+        """
+        Gets the delivery sent alongside an original message, waiting for it to be sent.
+
+        Gets ``None`` if none was reserved, or if it was cancelled or failed.
+        """
+        if (delivery := self._posts.get(source_id)) is None:
+            return None
+
+        return delivery if await delivery.sent is not None else None
+
+    async def edit(
+        self, source_id: int, content: str, edited: typing.Any = None, source: str | None = None
+    ) -> bool:
+        """
+        Edits the message sent alongside an original message in place.
+
+        Waits for it to be sent first, and returns whether there was one to edit.
+        An edit older than one already made, by when the original was ``edited``,
+        is dropped. The ``source`` it was translated from is remembered.
+        """
+        if (delivery := self._posts.get(source_id)) is None:
+            return False
+        if (message := await delivery.sent) is None:
+            return False
+        if edited is not None and delivery.edited is not None and edited < delivery.edited:
+            return False
+
+        delivery.content = content
+        delivery.edited = edited
+        delivery.source = source
+
+        try:
+            await self.webhooks.edit(delivery.channel_id, int(message.id), content)
+        except i.LibraryException:
+            log.exception(f"Could not edit message {message.id} in {delivery.channel_id}.")
+            return False
+
+        return True
+
+    async def close(self):
+        """Stops sending, dropping whatever is still waiting, and finishes the deletes underway."""
+        for task in self._workers.values():
+            task.cancel()
+
+        self._workers.clear()
+        # the translations of these messages went out, so leaving them would show both.
+        await asyncio.gather(*self._deleters.values(), return_exceptions=True)
+
+    async def _work(self, channel_id: int):
+        queue = self._queues[channel_id]
+
+        while queue:
+            delivery = queue[0]
+
+            message = None
+
+            try:
+                if not await delivery.ready:
+                    continue
+
+                message = await self.webhooks.execute(
+                    channel_id, delivery.content, **delivery.kwargs
+                )
+                self.latencies.append(time.monotonic() - delivery.created)
+                src.metrics.DELIVERY_SECONDS.observe(self.latencies[-1])
+
+                if delivery.message_id is not None:
+                    self._delete(channel_id, delivery.message_id)
+            except Exception:
+                log.exception(f"Could not deliver a translation to channel {channel_id}.")
+            finally:
+                queue.popleft()
+
+                if not delivery.sent.done():
+                    delivery.sent.set_result(message)
+
+        del self._queues[channel_id]
+        del self._workers[channel_id]
+
+    def _delete(self, channel_id: int, message_id: int):
+        self._deletes.setdefault(channel_id, []).append(message_id)
+
+        if channel_id not in self._deleters:
+            self._deleters[channel_id] = asyncio.get_running_loop().create_task(
+                self._delete_work(channel_id)
+            )
+
+    async def _delete_work(self, channel_id: int):
+        # whatever piles up while a delete is in flight goes out as one bulk delete.
+        while message_ids := self._deletes.pop(channel_id, None):
+            for start in range(0, len(message_ids), self.BULK):
+                chunk = message_ids[start : start + self.BULK]
+
+                try:
+                    with src.metrics.DISCORD_SECONDS.time(call="delete_messages"):
+                        if len(chunk) == 1:
+                            await self.bot._http.delete_message(channel_id, chunk[0])
+                        else:
+                            await self.bot._http.delete_messages(channel_id, chunk)
+                except i.LibraryException:
+                    log.exception(f"Could not delete {len(chunk)} messages in {channel_id}.")
+
+        del self._deleters[channel_id]
@@ -0,0 +1,135 @@
+"""
+The bot's source language detector. This guesses cheaply whether
+a message is already in the language it would be translated to.
+"""
+import collections
+import itertools
+import logging
+import re
+import unicodedata
+
+log = logging.getLogger(__name__)
+
+_WORDS = re.compile(r"[^\W\d_]+")
+
+# a handful of the most common words of each language. Words common to more
+# than one of these languages, like "que", "de" or "to", are left out, so every
+# word found counts towards one language only. Importing fails if any are shared.
+STOPWORDS: dict[str, frozenset[str]] = {
+    "en": frozenset("the and is are you that this with have for not what was it i to of".split()),
+    "de": frozenset("der die das und ist nicht ich du ein eine mit auch wie sie".split()),
+    "fr": frozenset("le les et est je tu pas une des avec pour qui vous nous mais dans".split()),
+    "es": frozenset("el los las y pero yo muy hay esto también pues ella aquí".split()),
+    "it": frozenset("il gli che è non per sono ma anche io questo della nel più".split()),
+    "pt": frozenset("o os não uma com mas eu você são muito isso ele".split()),
+    "nl": frozenset("het een niet ik dat van ook zijn wat maar heb hij zij".split()),
+    "pl": frozenset("nie jest że się jak tak już czy jestem bardzo mnie być".split()),
+}
+
+for (_code, _words), (_other, _others) in itertools.combinations(STOPWORDS.items(), 2):
+    if _words & _others:
+        raise ValueError(f"The {_code} and {_other} stopwords share {sorted(_words & _others)}.")
+
+# scripts that identify a language on their own.
+SCRIPTS: dict[str, str] = {
+    "GREEK": "el",
+    "HANGUL": "ko",
+    "HIRAGANA": "ja",
+    "KATAKANA": "ja",
+}
+
+
+def _script(char: str) -> str:
+    name = unicodedata.name(char, "")
+    return name.split(" ")[0] if name else ""
+
+
+def detect(text: str) -> str | None:
+    """
+    Guesses the base language code of a text, or ``None`` if it cannot tell.
+
+    Letters of a distinctive script decide on their own; otherwise Latin
+    text is scored against a short list of stopwords per language.
+    """
+    scripts: collections.Counter[str] = collections.Counter(
+        _script(char) for char in text if char.isalpha()
+    )
+
+    if not scripts:
+        return None
+
+    if scripts["HIRAGANA"] + scripts["KATAKANA"] >= sum(scripts.values()) * 0.1:
+        return "ja"
+
+    script, count = scripts.most_common(1)[0]
+
+    if count < sum(scripts.values()) * 0.8:
+        return None
+    if script in SCRIPTS:
+        return SCRIPTS[script]
+    if script == "CJK":
+        return "zh"
+    if script != "LATIN":
+        return None
+
+    words = _WORDS.findall(text.lower())
+    scores = sorted(
+        ((sum(word in stopwords for word in words), code) for code, stopwords in STOPWORDS.items()),
+        reverse=True,
+    )
+    (best, code), (second, _) = scores[0], scores[1]
+    return code if best >= 2 and best >= second * 2 else None
+
+
+class SourceDetector:
+    """
+    Decides whether a message is already written in its target language.
+
+    The local detector is tried first. When it cannot tell, the source
+    languages DeepL detected for the last ``history`` messages of the same
+    user in the same channel are used instead, if they all agree. Since
+    only messages sent to DeepL are remembered, every ``sample``th message
+    skipped that way is sent anyway, so a user switching languages is
+    noticed.
+    """
+
+    def __init__(self, history: int = 3, size: int = 10000, sample: int = 10):
+        self.history = history
+        self.size = size
+        self.sample = sample
+        self._detected: collections.OrderedDict[
+            tuple[int, int], collections.deque[str]
+        ] = collections.OrderedDict()
+        self._skipped: collections.Counter[tuple[int, int]] = collections.Counter()
+
+    def remember(self, user_id: int, channel_id: int, source_lang: str):
+        """Remembers the source language DeepL detected for a message."""
+        key = (user_id, channel_id)
+        detected = self._detected.pop(key, None) or collections.deque(maxlen=self.history)
+        detected.append(source_lang.lower().split("-")[0])
+        self._detected[key] = detected
+        self._skipped.pop(key, None)
+
+        if len(self._detected) > self.size:
+            evicted, _ = self._detected.popitem(last=False)
+            self._skipped.pop(evicted, None)
+
+    def is_target(self, text: str, target_lang: str, user_id: int, channel_id: int) -> bool:
+        """Checks whether a text is already in the target language."""
+        target = target_lang.lower().split("-")[0]
+
+        if (language := detect(text)) is not None:
+            return language == target
+
+        key = (user_id, channel_id)
+        detected = self._detected.get(key)
+
+        if (
+            detected is None
+            or len(detected) < self.history
+            or any(language != target for language in detected)
+        ):
+            return False
+
+        self._skipped[key] += 1
+        return self._skipped[key] % self.sample != 0
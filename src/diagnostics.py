@@ -0,0 +1,161 @@
+"""
+The bot's diagnostics. This inspects the running process, its
+event loop and its memory without executing any code given to it.
+"""
+import asyncio
+import collections
+import gc
+import io
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+import types
+
+# a function, as where it is defined and its name.
+Function = tuple[str, int, str]
+
+
+def _function(frame: types.FrameType) -> Function:
+    code = frame.f_code
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+
+class Profile:
+    """The samples a profiler took, counted per function."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.samples = 0
+        self.own: collections.Counter[Function] = collections.Counter()
+        self.total: collections.Counter[Function] = collections.Counter()
+
+    def add(self, frame: types.FrameType | None):
+        """Counts one sample of a stack, given its innermost frame."""
+        self.samples += 1
+
+        if frame is None:
+            return
+
+        self.own[_function(frame)] += 1
+        seen = set()
+
+        while frame is not None:
+            seen.add(_function(frame))
+            frame = frame.f_back
+
+        self.total.update(seen)
+
+    def render(self, top: int = 40) -> str:
+        """Lists the functions the most samples were taken in, and under."""
+        lines = [f"{self.samples} samples over {self.seconds:.1f}s.", ""]
+
+        for title, counter in (("Own time", self.own), ("Total time", self.total)):
+            lines.append(f"{title}:")
+
+            for (filename, line, name), count in counter.most_common(top):
+                share = count / self.samples * 100 if self.samples else 0
+                lines.append(f"{share:6.2f}% {count:7d}  {name} ({filename}:{line})")
+
+            lines.append("")
+
+        return "\n".join(lines)
+
+
+class SamplingProfiler:
+    """
+    A profiler sampling the stack of a thread every ``interval`` seconds.
+
+    Samples are taken from another thread, so the profiled one only
+    pauses while a sample is counted, and only one profile can run at
+    once.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def _sample(self, thread_id: int, seconds: float) -> Profile:
+        profile = Profile(seconds)
+        end = time.monotonic() + seconds
+
+        while time.monotonic() < end:
+            profile.add(sys._current_frames().get(thread_id))
+            time.sleep(self.interval)
+
+        return profile
+
+    async def profile(self, seconds: float) -> Profile:
+        """Samples the thread running the event loop for a number of seconds."""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running.")
+
+        try:
+            return await asyncio.to_thread(self._sample, threading.get_ident(), seconds)
+        finally:
+            self._lock.release()
+
+
+def dump_tasks() -> str:
+    """Lists every task on the running loop, with where each one is waiting."""
+    tasks = sorted(asyncio.all_tasks(), key=lambda task: task.get_name())
+    buffer = io.StringIO()
+    buffer.write(f"{len(tasks)} tasks.\n\n")
+
+    for task in tasks:
+        buffer.write(f"{task.get_name()}: {task.get_coro()!r}\n")
+        task.print_stack(file=buffer)
+        buffer.write("\n")
+
+    return buffer.getvalue()
+
+
+async def measure_lag(samples: int = 20, interval: float = 0.05) -> list[float]:
+    """Measures how late the event loop wakes up from a number of short sleeps."""
+    lags = []
+
+    for _ in range(samples):
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - start - interval))
+
+    return lags
+
+
+def memory(top: int = 25) -> str:
+    """Reports garbage collection, the process size and, when tracing, the top allocators."""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    lines = [
+        f"Max resident size: {usage.ru_maxrss / 1024:.1f} MiB",
+        f"Objects tracked by gc: {len(gc.get_objects())}",
+        f"Pending per generation: {gc.get_count()}",
+    ]
+
+    for generation, stats in enumerate(gc.get_stats()):
+        lines.append(
+            f"Generation {generation}: {stats['collections']} collections, "
+            f"{stats['collected']} collected, {stats['uncollectable']} uncollectable"
+        )
+
+    lines.append("")
+
+    if not tracemalloc.is_tracing():
+        lines.append("tracemalloc is not tracing, so there are no allocators to show.")
+        return "\n".join(lines)
+
+    current, peak = tracemalloc.get_traced_memory()
+    lines.append(f"Traced: {current / 1048576:.1f} MiB now, {peak / 1048576:.1f} MiB at peak.")
+    lines.append(f"Top {top} allocators:")
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__)]
+    )
+
+    for stat in snapshot.statistics("lineno")[:top]:
+        lines.append(str(stat))
+
+    return "\n".join(lines)
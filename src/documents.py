@@ -0,0 +1,146 @@
+"""
+The bot's document pipeline. This streams documents through
+DeepL's document translation API without holding them in memory.
+"""
+import asyncio
+import logging
+import tempfile
+import time
+
+import aiohttp
+
+import src.metrics
+import src.translator
+
+log = logging.getLogger(__name__)
+
+
+class DocumentError(Exception):
+    """An error raised when a document cannot be translated."""
+
+
+class DocumentPipeline:
+    """
+    A pipeline translating documents with DeepL's document API.
+
+    The attachment is streamed into a spooled temporary file, which only
+    spills to disk past ``spool`` bytes, and is rejected once it exceeds
+    ``limit`` bytes. It is then uploaded, polled with a backoff until DeepL
+    is done, and streamed back into another spooled file ready to be sent.
+    At most ``concurrency`` documents are processed at once, and one DeepL
+    has not translated within ``deadline`` seconds is given up on.
+    """
+
+    def __init__(
+        self,
+        translator: src.translator.AsyncTranslator,
+        limit: int = 10 * 1024 * 1024,
+        spool: int = 1024 * 1024,
+        concurrency: int = 4,
+        chunk: int = 64 * 1024,
+        deadline: float = 300.0,
+    ):
+        self.translator = translator
+        self.limit = limit
+        self.spool = spool
+        self.chunk = chunk
+        self.deadline = deadline
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def _download(self, url: str) -> tempfile.SpooledTemporaryFile:
+        document = tempfile.SpooledTemporaryFile(max_size=self.spool)
+        size = 0
+
+        try:
+            async with self.translator.session.get(
+                url, timeout=aiohttp.ClientTimeout(total=self.translator.timeout * 6)
+            ) as response:
+                response.raise_for_status()
+
+                if (response.content_length or 0) > self.limit:
+                    raise DocumentError("The document is too large to be translated.")
+
+                async for chunk in response.content.iter_chunked(self.chunk):
+                    size += len(chunk)
+
+                    if size > self.limit:
+                        raise DocumentError("The document is too large to be translated.")
+
+                    document.write(chunk)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            document.close()
+            raise DocumentError("The document could not be downloaded.") from error
+        except BaseException:
+            document.close()
+            raise
+
+        document.seek(0)
+        return document
+
+    async def _wait(self, handle, backoff: float = 1.0, cap: float = 10.0):
+        deadline = time.monotonic() + self.deadline
+
+        while True:
+            status = await self.translator.translate_document_get_status(handle)
+
+            if not status.ok:
+                raise DocumentError(status.error_message or "The document could not be translated.")
+            if status.done:
+                if self.translator.ledger is not None and status.billed_characters:
+                    self.translator.ledger.bill(status.billed_characters)
+                return
+
+            if (remaining := deadline - time.monotonic()) <= 0:
+                raise DocumentError("DeepL took too long to translate the document.")
+
+            # DeepL's own estimate is preferred, but never trusted to be shorter than our backoff.
+            await asyncio.sleep(min(max(status.seconds_remaining or 0, backoff), cap, remaining))
+            backoff = min(backoff * 1.5, cap)
+
+    async def translate(
+        self,
+        url: str,
+        filename: str,
+        target_lang: str,
+        formality: str | None = None,
+        size: int | None = None,
+    ) -> tempfile.SpooledTemporaryFile:
+        """
+        Translates the document at a URL, returning the translated file rewound to its start.
+
+        The caller owns the returned file and should close it once sent.
+        """
+        if size is not None and size > self.limit:
+            raise DocumentError("The document is too large to be translated.")
+
+        kwargs = {"target_lang": target_lang, "filename": filename}
+
+        if formality:
+            kwargs["formality"] = formality
+
+        async with self._semaphore:
+            with src.metrics.stage("download"):
+                document = await self._download(url)
+
+            with document, src.metrics.stage("upload"):
+                handle = await self.translator.translate_document_upload(
+                    document, timeout=self.translator.timeout * 6, **kwargs
+                )
+
+            with src.metrics.stage("poll"):
+                await self._wait(handle)
+
+            output = tempfile.SpooledTemporaryFile(max_size=self.spool)
+
+            try:
+                with src.metrics.stage("fetch"):
+                    await self.translator.translate_document_download(
+                        handle, output, timeout=self.translator.timeout * 6
+                    )
+            except BaseException:
+                output.close()
+                raise
+
+            log.debug(f"Translated the document {filename} to {target_lang}.")
+            output.seek(0)
+            return output
@@ -0,0 +1,118 @@
+import asyncio
+import io
+import statistics
+import time
+import tracemalloc
+
+import interactions as i
+from interactions.ext import enhanced
+
+import src.const
+import src.diagnostics
+import src.metrics
+import src.services
+
+
+class Debug(enhanced.EnhancedExtension):
+    """An extension dedicated to /debug, for the bot's owner only."""
+
+    def __init__(self, bot: i.Client, services: src.services.Services):
+        self.bot = bot
+        self.services = services
+        self.profiler = src.diagnostics.SamplingProfiler()
+
+    @staticmethod
+    def _attach(name: str, text: str) -> i.File:
+        return i.File(filename=f"{name}-{int(time.time())}.txt", fp=io.BytesIO(text.encode()))
+
+    # everyone sees the command, since the owner need not be an administrator where they use it.
+    @enhanced.extension_command(dm_permission=False)
+    async def debug(self, ctx: i.CommandContext, **kwargs):
+        """Inspects the running bot instance."""
+        if int(ctx.author.id) != src.const.OWNER_ID:
+            await ctx.send(":x: You are not allowed to use this command.", ephemeral=True)
+            return i.StopCommand
+
+        await ctx.defer(ephemeral=True)
+
+    @debug.subcommand(name="profile")
+    async def debug_profile(
+        self,
+        ctx: i.CommandContext,
+        base_res,
+        seconds: enhanced.EnhancedOption(
+            int, description="How long to profile for, up to a minute.", min_value=1, max_value=60
+        ) = 10,
+    ):
+        """Samples what the bot spends its time on, and lists the hottest functions."""
+        if self.profiler.running:
+            await ctx.send(":x: A profile is already running.", ephemeral=True)
+            return
+
+        profile = await self.profiler.profile(seconds)
+        await ctx.send(
+            f":heavy_check_mark: Took {profile.samples} samples over {seconds}s.",
+            files=self._attach("profile", profile.render()),
+            ephemeral=True,
+        )
+
+    @debug.subcommand(name="tasks")
+    async def debug_tasks(self, ctx: i.CommandContext, base_res):
+        """Lists every asyncio task with where it is waiting."""
+        await ctx.send(
+            f":heavy_check_mark: {len(asyncio.all_tasks())} tasks are running.",
+            files=self._attach("tasks", src.diagnostics.dump_tasks()),
+            ephemeral=True,
+        )
+
+    @debug.subcommand(name="lag")
+    async def debug_lag(self, ctx: i.CommandContext, base_res):
+        """Measures how late the event loop wakes up."""
+        lags = await src.diagnostics.measure_lag()
+        last = src.metrics.LOOP_LAG.values().get((), 0.0)
+        await ctx.send(
+            f"Event loop lag over {len(lags)} sleeps: median "
+            f"{statistics.median(lags) * 1000:.1f}ms, max {max(lags) * 1000:.1f}ms.\n"
+            f"Last measured by the metrics server: {last * 1000:.1f}ms.",
+            ephemeral=True,
+        )
+
+    @debug.subcommand(name="memory")
+    async def debug_memory(
+        self,
+        ctx: i.CommandContext,
+        base_res,
+        trace: enhanced.EnhancedOption(
+            bool, description="Should allocations be traced from now on? Tracing costs memory."
+        ) = None,
+    ):
+        """Reports garbage collection and memory use, with the top allocators when tracing."""
+        if trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif trace is False and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+        report = await asyncio.to_thread(src.diagnostics.memory)
+        await ctx.send(
+            f":heavy_check_mark: tracemalloc is {'on' if tracemalloc.is_tracing() else 'off'}.",
+            files=self._attach("memory", report),
+            ephemeral=True,
+        )
+
+    @debug.subcommand(name="sizes")
+    async def debug_sizes(self, ctx: i.CommandContext, base_res):
+        """Shows how much each cache and queue holds."""
+        lines = []
+
+        for kind, name in (("pool", "disword_pool_size"), ("queue", "disword_queue_depth")):
+            if metric := src.metrics.REGISTRY.get(name):
+                lines.extend(
+                    f"{kind} {labels[0]}: {value}"
+                    for labels, value in sorted(metric.values().items())
+                )
+
+        await ctx.send("\n".join(lines) or "No cache or queue is running.", ephemeral=True)
+
+
+def setup(bot: i.Client, services: src.services.Services | None = None):
+    Debug(bot, services or src.services.Services())
@@ -1,14 +1,179 @@
+import asyncio
+import glob
+import logging
+import os
+
 import interactions as i
-import yaml
 
 import src.model
 
+log = logging.getLogger(__name__)
+
+Page = tuple[i.Embed, i.SelectMenu | None]
+
+
+def _compile_table(table: dict) -> dict[str | None, Page]:
+    """Compiles a help table into the ready-to-send page of every command."""
+    commands: list = [
+        src.model.HelpTable(
+            name=f"/{cmd}",
+            description=table[cmd]["description"],
+            explanation=table[cmd]["explanation"],
+            examples=table[cmd]["examples"],
+        )
+        for cmd in table
+    ]
+    menu = i.SelectMenu(
+        options=[
+            i.SelectOption(
+                label="/translate text",
+                value="translate_text",
+                description='Translates a given message or "string" of text to another language.',
+            ),
+            i.SelectOption(
+                label="/translate automatic",
+                value="translate_automatic",
+                description="Automatically translates messages sent to another language.",
+            ),
+        ],
+        placeholder="Select a command for more help.",
+        custom_id="help_selection",
+    )
+    pages: dict[str | None, Page] = {}
+
+    embed = i.Embed(
+        title="Help",
+        description=f"{table['help']['description']}\n\n{table['help']['explanation']}",
+    )
+    [embed.add_field(name=cmd.name, value=cmd.description, inline=False) for cmd in commands]
+    pages[None] = (embed, None)
+
+    for cmd in commands:
+        embed = i.Embed(title="Help")
+        embed.add_field(
+            name=cmd.name,
+            value=f"{cmd.description}\n\n• " + "\n• ".join(cmd.examples),
+            inline=False,
+        )
+        pages[cmd.name.removeprefix("/")] = (embed, menu if cmd.name == "/translate" else None)
+
+    return pages
+
 
 class Help(i.Extension):
     """An extension dedicated to /help."""
 
-    def __init__(self, bot: i.Client):
+    def __init__(self, bot: i.Client, path: str = "./db/help.yaml", interval: float = 5.0):
         self.bot = bot
+        self.path = path
+        self.interval = interval
+        self._mtimes: dict[str, float] = {}
+        self._pages: dict[str | None, dict[str | None, Page]] = {}
+        self._selections: dict[str, i.Embed] = self._compile_selections()
+        self._task: asyncio.Task | None = None
+
+    @staticmethod
+    def _compile_selections() -> dict[str, i.Embed]:
+        """Compiles the embeds of the /translate help selection, which never change."""
+        selections: dict[str, i.Embed] = {}
+
+        embed = i.Embed(title="Help")
+        embed.add_field(
+            name="/translate text",
+            value="\n".join(
+                [
+                    "The `/translate text` command is the most powerful and simplified command Disword provides to users. "
+                    "By default, you will be required to supply only one of two inputs: `string` if you want to convert a set "
+                    "of text by itself, and `message_id` if you want to translate an existing message.\n",
+                    "In order to use `message_id` specifically, you must have **Developer Mode** enabled in your settings. "
+                    "This is accessible by going to User Settings > Advanced.\n",
+                    '• `/translate text language: "de" string: "hello world"` will translate the contents into German.',
+                    '• `/translate text language: "de" message_id: "991384835790753843"` will translate the message of its ID given into German.\n',
+                    "You can additionally pass another option, `formality` which controls how formal you want your response to sound. "
+                    "Some languages are not supported by the API for formality unfortunately, so you'll have to play around and see.\n",
+                    "`mimic` is another option provided in the command that allows your command response to appear as a **webhook** "
+                    "object. Please see `/translate automatic` for being able to control this automatically.",
+                ]
+            ),
+        )
+        selections["translate_text"] = embed
+
+        embed = i.Embed(title="Help")
+        embed.add_field(
+            name="/translate automatic",
+            value="\n".join(
+                [
+                    "The `/translate automatic` command is the second most powerful and simplified command offered. "
+                    "Have you ever been tired of having to rapid-fire numerous slash commands to have a conversation with "
+                    "someone in another language? Well, now you no longer need to. With this command, you can toggle your "
+                    "messages to be sent in any other language. Your messages will be deleted through this and sent as "
+                    "**webhooks** instead, which take on the appearance of your username and profile image. The image will "
+                    "additionally adapt to your server profile if you have one set!\n",
+                    "Disword requires the **Manage Messages** permission solely for this reason.\n",
+                    '• `/translate automatic language: "de"` will toggle you as a user for whether you want your messages to be sent '
+                    "in German or not.",
+                ]
+            ),
+        )
+        selections["translate_automatic"] = embed
+
+        return selections
+
+    def _sources(self) -> dict[str | None, str]:
+        """Finds the help table of every locale, such as ``help.de.yaml`` next to ``help.yaml``."""
+        root, ext = os.path.splitext(self.path)
+        sources: dict[str | None, str] = {None: self.path}
+
+        for path in glob.glob(f"{root}.*{ext}"):
+            sources[path[len(root) + 1 : -len(ext)]] = path
+
+        return sources
+
+    def _reload(self):
+        """Recompiles the help pages if any help table has changed since it was last compiled."""
+        # YAML is only needed once someone asks for help, so it is not imported at startup.
+        import yaml
+
+        sources = self._sources()
+        mtimes: dict[str, float] = {}
+
+        for path in sources.values():
+            try:
+                mtimes[path] = os.stat(path).st_mtime
+            except FileNotFoundError:
+                pass
+
+        if mtimes == self._mtimes:
+            return
+
+        pages: dict[str | None, dict[str | None, Page]] = {}
+
+        for locale, path in sources.items():
+            if path not in mtimes:
+                continue
+
+            try:
+                with open(path, "r") as f:
+                    pages[locale] = _compile_table(yaml.safe_load(f))
+            except (yaml.YAMLError, KeyError, TypeError):
+                log.exception(f"Could not compile the help table at {path}.")
+                return
+
+        self._pages = pages
+        self._mtimes = mtimes
+        log.debug(f"Compiled the help pages for {len(pages)} locales.")
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.interval)
+
+            if self._mtimes:
+                self._reload()
+
+    @i.extension_listener(name="on_ready")
+    async def _start_watch(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._watch())
 
     @i.extension_command(
         name="help",
@@ -33,101 +198,26 @@ class Help(i.Extension):
         ctx: i.CommandContext,
         command: str = None,
     ):
-        table: dict = yaml.safe_load(open("./db/help.yaml", "r").read())
-        commands: list = [
-            src.model.HelpTable(
-                name=f"/{cmd}",
-                description=table[cmd]["description"],
-                explanation=table[cmd]["explanation"],
-                examples=table[cmd]["examples"],
-            )
-            for cmd in table
-        ]
-        embed = i.Embed(title="Help")
-        menu = i.SelectMenu(
-            options=[
-                i.SelectOption(
-                    label="/translate text",
-                    value="translate_text",
-                    description='Translates a given message or "string" of text to another language.',
-                ),
-                i.SelectOption(
-                    label="/translate automatic",
-                    value="translate_automatic",
-                    description="Automatically translates messages sent to another language.",
-                ),
-            ],
-            placeholder="Select a command for more help.",
-            custom_id="help_selection",
-            disabled=True,
-        )
+        locale: str | None = ctx.locale
 
-        if command is None:
-            embed.description = f"{table['help']['description']}\n\n{table['help']['explanation']}"
-            [
-                [embed.add_field(name=cmd.name, value=cmd.description, inline=False)]
-                for cmd in commands
-            ]
-        else:
-            for cmd in commands:
-                if command == cmd.name.removeprefix("/"):
-                    cmd.examples[0] = f"• {cmd.examples[0]}"
-                    embed.add_field(
-                        name=cmd.name,
-                        value=f"{cmd.description}\n\n" + "\n• ".join(cmd.examples),
-                        inline=False,
-                    )
-                    break
-                elif command == "translate":
-                    menu.disabled = False
-
-        if menu.disabled:
+        if not self._mtimes:
+            self._reload()
+        if locale not in self._pages:
+            locale = locale.split("-")[0] if locale else None
+        if locale not in self._pages:
+            locale = None
+
+        pages = self._pages[locale]
+        embed, menu = pages.get(command, pages[None])
+
+        if menu is None:
             await ctx.send(embeds=embed)
         else:
             await ctx.send(embeds=embed, components=menu)
 
     @i.extension_component("help_selection")
     async def _select_translate_help(self, ctx: i.ComponentContext, option: list):
-        embed = i.Embed(title="Help")
-
-        if option[0] == "translate_text":
-            embed.add_field(
-                name="/translate text",
-                value="\n".join(
-                    [
-                        "The `/translate text` command is the most powerful and simplified command Disword provides to users. "
-                        "By default, you will be required to supply only one of two inputs: `string` if you want to convert a set "
-                        "of text by itself, and `message_id` if you want to translate an existing message.\n",
-                        "In order to use `message_id` specifically, you must have **Developer Mode** enabled in your settings. "
-                        "This is accessible by going to User Settings > Advanced.\n",
-                        '• `/translate text language: "de" string: "hello world"` will translate the contents into German.',
-                        '• `/translate text language: "de" message_id: "991384835790753843"` will translate the message of its ID given into German.\n',
-                        "You can additionally pass another option, `formality` which controls how formal you want your response to sound. "
-                        "Some languages are not supported by the API for formality unfortunately, so you'll have to play around and see.\n",
-                        "`mimic` is another option provided in the command that allows your command response to appear as a **webhook** "
-                        "object. Please see `/translate automatic` for being able to control this automatically.",
-                    ]
-                ),
-            )
-        elif option[0] == "translate_automatic":
-            embed.add_field(
-                name="/translate automatic",
-                value="\n".join(
-                    [
-                        "The `/translate automatic` command is the second most powerful and simplified command offered. "
-                        "Have you ever been tired of having to rapid-fire numerous slash commands to have a conversation with "
-                        "someone in another language? Well, now you no longer need to. With this command, you can toggle your "
-                        "messages to be sent in any other language. Your messages will be deleted through this and sent as "
-                        "**webhooks** instead, which take on the appearance of your username and profile image. The image will "
-                        "additionally adapt to your server profile if you have one set!\n",
-                        "Disword requires the **Manage Messages** permission solely for this reason.\n",
-                        '• `/translate automatic language: "de"` will toggle you as a user for whether you want your messages to be sent '
-                        "in German or not.",
-                    ]
-                ),
-            )
-
-        await ctx.send(embeds=embed)
+        await ctx.send(embeds=self._selections[option[0]])
 
 
 def setup(bot: i.Client):
@@ -43,5 +43,5 @@ class PrivacyPolicy(enhanced.EnhancedExtension):
         await ctx.send(embeds=embed, ephemeral=True)
 
 
-def setup(bot: i.Client):
+def setup(bot: i.Client, **kwargs):
     PrivacyPolicy(bot)
@@ -1,27 +1,212 @@
-import io
-import json
+import asyncio
 import logging
+import time
 import uuid
 
-import attrs
 import deepl
 import interactions as i
-import requests
 from interactions.ext import enhanced
 
+import src.batcher
 import src.const
+import src.delivery
+import src.detect
+import src.documents
+import src.fanout
+import src.languages
+import src.markup
+import src.messages
+import src.metrics
 import src.model
+import src.scheduler
+import src.services
+import src.store
+import src.webhooks
 
-logging.basicConfig(level=logging.DEBUG)
-log = logging.getLogger()
+log = logging.getLogger(__name__)
 
 
 class Translate(enhanced.EnhancedExtension):
     """An extension dedicated to /translate."""
 
-    def __init__(self, bot: i.Client):
+    def __init__(self, bot: i.Client, services: src.services.Services):
         self.bot = bot
-        self.translator = deepl.Translator(src.const.AUTH_KEY)
+        self.services = services
+        self.quota = services.quota
+        self.translator = services.translator
+        self.scheduler = services.scheduler
+        self.batcher = src.batcher.TranslationBatcher(
+            self.translator,
+            window=src.const.BATCH_WINDOW,
+            size=src.const.BATCH_SIZE,
+            ledger=self.quota,
+        )
+        self.fanout = src.fanout.FanOut(self.batcher)
+        self.documents = src.documents.DocumentPipeline(
+            self.translator, limit=src.const.DOCUMENT_LIMIT
+        )
+        self.detector = src.detect.SourceDetector()
+        self.languages = src.languages.LanguageIndex()
+        self.messages = src.messages.MessageCache(
+            size=src.const.MESSAGE_CACHE_SIZE,
+            age=src.const.MESSAGE_CACHE_AGE,
+            limit=src.const.MESSAGE_CACHE_LIMIT,
+        )
+        self.store = src.store.PreferenceStore(
+            src.store.SQLiteBackend(src.const.DATABASE, shared=services.shared)
+            if src.const.STORAGE == "sqlite"
+            else src.store.JSONBackend()
+        )
+        self.webhooks = src.webhooks.WebhookPool(
+            bot, self.store, shard=services.shard, shards=services.shards
+        )
+        self.delivery = src.delivery.DeliveryQueue(bot, self.webhooks)
+        services.snapshots.register("languages", self.languages.dump, self.languages.restore)
+        services.snapshots.register("webhooks", self.webhooks.dump, self.webhooks.restore)
+        services.on_close(self.close)
+        src.metrics.REGISTRY.gauge(
+            "disword_queue_depth",
+            "How many items are waiting in each queue.",
+            ["queue"],
+            function=lambda: {
+                ("scheduler",): len(self.scheduler),
+                ("batcher",): len(self.batcher),
+                ("delivery",): self.delivery.depth,
+            },
+        )
+        src.metrics.REGISTRY.gauge(
+            "disword_pool_size",
+            "How many entries each in-memory pool holds.",
+            ["pool"],
+            function=lambda: {
+                ("cache",): len(self.translator.cache),
+                ("fanout",): len(self.fanout),
+                ("messages",): len(self.messages),
+                ("webhooks",): len(self.webhooks),
+            },
+        )
+        src.metrics.REGISTRY.counter(
+            "disword_cache_total",
+            "Translation cache lookups and drops.",
+            ["event"],
+            function=lambda: {
+                ("hit",): self.translator.cache.stats.hits,
+                ("miss",): self.translator.cache.stats.misses,
+                ("evicted",): self.translator.cache.stats.evicted,
+                ("expired",): self.translator.cache.stats.expired,
+            },
+        )
+        src.metrics.REGISTRY.counter(
+            "disword_message_cache_total",
+            "Message cache lookups and drops.",
+            ["event"],
+            function=lambda: {
+                ("hit",): self.messages.stats.hits,
+                ("miss",): self.messages.stats.misses,
+                ("evicted",): self.messages.stats.evicted,
+                ("expired",): self.messages.stats.expired,
+            },
+        )
+
+    @i.extension_listener(name="on_ready")
+    async def _start_store(self):
+        self.store.start()
+        self.webhooks.start()
+        self.messages.start()
+        self.services.start()
+
+        try:
+            await self.languages.refresh(self.translator)
+        except (deepl.DeepLException, asyncio.TimeoutError):
+            log.debug("Could not refresh the language index, keeping the built-in one.")
+
+    async def close(self):
+        """Stops the background tasks and saves whatever the store has left."""
+        self.batcher.close()
+        self.webhooks.close()
+        self.messages.close()
+        await self.delivery.close()
+        await self.store.close()
+
+    async def _lookup(self, channel_id: int, message_id: int) -> str | None:
+        """Gets the content of a message, from the gateway's cache before asking REST."""
+        if (content := self.messages.get(channel_id, message_id)) is not None:
+            return content
+
+        with src.metrics.stage("lookup"):
+            msg = await self.bot._http.get_message(channel_id, message_id)
+
+        if not msg:
+            return None
+
+        content = msg.get("content") or ""
+        self.messages.put(channel_id, message_id, content)
+        return content
+
+    async def _translate(
+        self, ctx: i.CommandContext, text: str, language: str, formality: str | None = None
+    ) -> str | None:
+        """
+        Translates text for a command, keeping markup as is.
+
+        Responds with an error and returns ``None`` if it could not be translated.
+        """
+        _error_embed = i.Embed()
+        segments = src.markup.segment(text or "")
+
+        if not segments.texts:
+            _error_embed.description = ":x: There is nothing to translate in this message."
+            await ctx.send(embeds=_error_embed, ephemeral=True)
+            return None
+
+        characters = len(text) - segments.saved
+
+        if not self.quota.allows(characters):
+            _error_embed.description = (
+                ":x: Disword has reached its translation quota. Please try again later."
+            )
+            await ctx.send(embeds=_error_embed, ephemeral=True)
+            return None
+
+        kwargs = {"formality": formality} if formality else {}
+
+        try:
+            translations = await self.scheduler.submit(
+                lambda: self.translator.translate_text(
+                    segments.texts, target_lang=language, **kwargs, **src.markup.OPTIONS
+                ),
+                guild_id=int(ctx.guild_id) if ctx.guild_id else None,
+                interactive=True,
+            )
+        except (src.scheduler.SchedulerFull, deepl.TooManyRequestsException):
+            _error_embed.description = ":x: Disword is currently busy. Please try again later."
+            await ctx.send(embeds=_error_embed, ephemeral=True)
+            return None
+        except asyncio.TimeoutError:
+            _error_embed.description = ":x: DeepL took too long to respond. Please try again later."
+            await ctx.send(embeds=_error_embed, ephemeral=True)
+            return None
+        except deepl.DeepLException as error:
+            log.warning(f"Could not translate text to {language}: {error}")
+
+            if formality and "message: " in str(error):
+                # DeepL explains which languages do not support formality.
+                message = str(error).split("message: ")[1]
+                _error_embed.description = ":x: " + message.replace("'", "**").replace(
+                    "target_lang", language.upper()
+                )
+            else:
+                _error_embed.description = ":x: Could not translate this. Please try again later."
+
+            await ctx.send(embeds=_error_embed, ephemeral=True)
+            return None
+
+        self.quota.record(
+            sum(translation.billed_characters for translation in translations),
+            int(ctx.guild_id) if ctx.guild_id else None,
+            int(ctx.author.id),
+        )
+        return segments.join([translation.text for translation in translations])
 
     @enhanced.extension_command()
     @enhanced.autodefer(delay=0)
@@ -30,6 +215,7 @@ class Translate(enhanced.EnhancedExtension):
         log.debug("/translate was run, returning result...")
 
     @translate.subcommand(name="text")
+    @src.metrics.traced("translate_text")
     async def translate_text(
         self,
         ctx: i.CommandContext,
@@ -58,6 +244,7 @@ class Translate(enhanced.EnhancedExtension):
     ):
         """Translates a given message or "string" of text to another language."""
         _error_embed = i.Embed()
+        self.languages.remember(int(ctx.author.id), language)
 
         if not string and not message_id:
             _error_embed.description = (
@@ -75,62 +262,48 @@ class Translate(enhanced.EnhancedExtension):
             )
 
             if message_id:
-                msg = await self.bot._http.get_message(ctx.channel_id, int(message_id))
+                text = await self._lookup(int(ctx.channel_id), int(message_id))
 
-                if not msg:
+                if text is None:
                     _error_embed.description = (
                         ":x: The message from the ID provided does not exist."
                     )
                     await ctx.send(embeds=_error_embed, ephemeral=True)
-                else:
-                    text = msg.get("content")
+                    return
             else:
                 text = string
 
-            if formality:
-                try:
-                    result = self.translator.translate_text(
-                        text, target_lang=language, formality=formality
-                    )
-                except deepl.DeepLException as error:
-                    _error_embed.description = ":x: " + (str(error).split("message: ")[1]).replace(
-                        "'", "**"
-                    ).replace("target_lang", language.upper())
-                    await ctx.send(embeds=_error_embed, ephemeral=True)
-            else:
-                result = self.translator.translate_text(text, target_lang=language)
+            result = await self._translate(ctx, text, language, formality)
 
-            if mimic:
-                webhook = i.Webhook()
-                webhook = await webhook.create(
-                    client=self.bot._http,
-                    channel_id=int(ctx.channel_id),
-                    name="Disword mimicked translation",
-                )
+            if result is None:
+                return
 
+            if mimic:
                 if message_id:
-                    await webhook.execute(
-                        result.text,
+                    self.delivery.send(
+                        int(ctx.channel_id),
+                        result,
                         username=ctx.author.user.username,
                         avatar_url=ctx.author.user.avatar_url,
                         components=button,
                     )
                 else:
-                    await webhook.execute(
-                        result.text,
+                    self.delivery.send(
+                        int(ctx.channel_id),
+                        result,
                         username=ctx.author.user.username,
                         avatar_url=ctx.author.user.avatar_url,
                     )
 
-                await webhook.delete()
                 await ctx.send(":heavy_check_mark: Response has been triggered.", ephemeral=True)
             else:
                 if message_id:
-                    await ctx.send(result.text, components=button)
+                    await ctx.send(result, components=button)
                 else:
-                    await ctx.send(result.text)
+                    await ctx.send(result)
 
     @translate.subcommand(name="automatic")
+    @src.metrics.traced("translate_automatic")
     async def translate_automatic(
         self,
         ctx: i.CommandContext,
@@ -138,42 +311,68 @@ class Translate(enhanced.EnhancedExtension):
         language: enhanced.EnhancedOption(
             str, description="The language to translate to.", autocomplete=True
         ),
+        channel: enhanced.EnhancedOption(
+            bool, description="Should everyone's messages in this channel be translated?"
+        ) = False,
     ):
         """Automatically translates messages sent to another language."""
-        db = json.loads(open("./db/translation.json", "r").read())
-        id: str = str(ctx.author.id)  # convert Snowflake to str
-
-        if db.get(id):
-            if db[id]["automatic"]:
-                db[id].update({"automatic": False})
-                await ctx.send(
-                    ":heavy_check_mark: Automatic translation has been disabled.", ephemeral=True
-                )
-            else:
-                db[id].update({"automatic": True, "language": language})
-                await ctx.send(
-                    f":heavy_check_mark: Automatic translation for **{language.upper()}** has been enabled.",
-                    ephemeral=True,
-                )
-        else:
-            # FIXME: This is a poor implementation of easily accessing the language data.
-            # Yet again, DeepL cannot properly utilise a fucking enum.
-            for key, val in deepl.Language.__dict__.items():
-                if language == val:
-                    user = src.model.TranslationUser(
-                        int(ctx.author.id), deepl.Language.__dict__[key]
-                    )
-                    db.update({id: attrs.asdict(user)})
-                    break
+        if language not in self.languages:
+            await ctx.send(
+                embeds=i.Embed(description=f":x: **{language}** is not a supported language."),
+                ephemeral=True,
+            )
+            return
+
+        self.languages.remember(int(ctx.author.id), language)
 
+        if channel:
+            await self._subscribe_channel(ctx, language)
+            return
+
+        user = self.store.get_user(int(ctx.author.id))
+
+        if user and user.automatic:
+            user.automatic = False
+            self.store.set_user(user)
+            await ctx.send(
+                ":heavy_check_mark: Automatic translation has been disabled.", ephemeral=True
+            )
+        else:
+            self.store.set_user(src.model.TranslationUser(int(ctx.author.id), language))
             await ctx.send(
                 f":heavy_check_mark: Automatic translation for **{language.upper()}** has been enabled.",
                 ephemeral=True,
             )
 
-        db = open("./db/translation.json", "w").write(json.dumps(db, indent=4, sort_keys=True))
+    async def _subscribe_channel(self, ctx: i.CommandContext, language: str):
+        """Toggles a language of the channel's subscription."""
+        if not await ctx.has_permissions(i.Permissions.MANAGE_CHANNELS):
+            await ctx.send(
+                embeds=i.Embed(
+                    description=":x: You need the **Manage Channels** permission to do this."
+                ),
+                ephemeral=True,
+            )
+            return
+
+        language = language.upper()
+        languages = self.store.get_languages(int(ctx.channel_id))
+
+        if language in languages:
+            self.store.set_languages(
+                int(ctx.channel_id), [code for code in languages if code != language]
+            )
+            await ctx.send(
+                f":heavy_check_mark: This channel is no longer translated to **{language}**."
+            )
+        else:
+            self.store.set_languages(int(ctx.channel_id), [*languages, language])
+            await ctx.send(
+                f":heavy_check_mark: This channel is now also translated to **{language}**."
+            )
 
     @translate.subcommand(name="document")
+    @src.metrics.traced("translate_document")
     async def translate_document(
         self,
         ctx: i.CommandContext,
@@ -186,116 +385,303 @@ class Translate(enhanced.EnhancedExtension):
         ),
     ):
         """Translates a given document file with contents to another language."""
-        content = requests.get(file.url).text
         id = uuid.uuid4()
         name = f"{id}.{''.join(file.filename.split('.')[1:])}"
-        result = self.translator.translate_text(
-            content,
-            target_lang=language,
-            split_sentences=deepl.SplitSentences.OFF,
-            preserve_formatting=True,
-        )
 
-        file_to_send = io.StringIO(result.text)
-        with file_to_send as f:
+        if not self.quota.allows(0):
+            await ctx.send(
+                embeds=i.Embed(
+                    description=":x: Disword has reached its translation quota. Please try again later."
+                ),
+                ephemeral=True,
+            )
+            return
+
+        try:
+            document = await self.scheduler.submit(
+                lambda: self.documents.translate(file.url, file.filename, language, size=file.size),
+                guild_id=int(ctx.guild_id) if ctx.guild_id else None,
+                interactive=True,
+            )
+        except src.scheduler.SchedulerFull:
+            await ctx.send(
+                embeds=i.Embed(
+                    description=":x: Disword is currently busy. Please try again later."
+                ),
+                ephemeral=True,
+            )
+            return
+        except asyncio.TimeoutError:
+            await ctx.send(
+                embeds=i.Embed(
+                    description=":x: DeepL took too long to respond. Please try again later."
+                ),
+                ephemeral=True,
+            )
+            return
+        except (src.documents.DocumentError, deepl.DeepLException) as error:
+            await ctx.send(embeds=i.Embed(description=f":x: {error}"), ephemeral=True)
+            return
+
+        with document as f:
             _file = i.File(filename=name, fp=f)
             await ctx.send(files=_file)
 
     @i.extension_autocomplete(command="translate", name="language")
+    @src.metrics.traced("autocomplete")
     async def _render_lang_translate(self, ctx: i.CommandContext, language: str = ""):
         """
         Renders and presents the list of languages selectable for /translate commands.
 
-        This code works as a crude fuzzy matching algorithm that makes lazy
-        comparisons from the focused value given from the Discord API to the known
-        list of languages from the DeepL API.
+        Choices come from a precomputed index of languages, ranking code and prefix
+        matches above substring ones, and the user's recent languages and locale
+        above the rest.
         """
-        letters: list = list(language) if language != "" else []
-        languages: list[str] = [
-            lang.capitalize() for lang in deepl.Language.__dict__ if lang.isupper()
-        ]
-        languages.remove("English")
-        languages.remove("Portuguese")
-
-        if not letters:
-            await ctx.populate(
-                [
-                    i.Choice(
-                        name=(
-                            lang
-                            if not lang.startswith("English") and not lang.startswith("Portuguese")
-                            else f"{lang.split('_')[0]} {lang.split('_')[1][:1].upper()}{lang.split('_')[1][1:]}"
-                        ),
-                        value=deepl.Language.__dict__[lang.upper()],
-                    )
-                    for lang in languages[0:24]
-                ]
-            )
+        await ctx.populate(
+            [
+                i.Choice(name=entry.name, value=entry.code)
+                for entry in self.languages.search(language, int(ctx.author.id), ctx.locale)
+            ]
+        )
+
+    @i.extension_message_command(name="Translate")
+    @src.metrics.traced("translate_message")
+    async def translate_message(self, ctx: i.CommandContext):
+        """Translates a message to your automatic translation language, or your own locale's."""
+        await ctx.defer(ephemeral=True)
+        message: i.Message = ctx.target
+        text = message.content or await self._lookup(int(ctx.channel_id), int(message.id))
+        user = self.store.get_user(int(ctx.author.id))
+
+        if user:
+            language = user.language
         else:
-            choices: list = []
-
-            for lang in languages:
-                focus: str = "".join(letters)
-
-                if focus.lower() in lang.lower() and len(languages) > 26:
-                    choices.append(
-                        i.Choice(
-                            name=(
-                                lang
-                                if not lang.startswith("English")
-                                and not lang.startswith("Portuguese")
-                                else f"{lang.split('_')[0]} {lang.split('_')[1][:1].upper()}{lang.split('_')[1][1:]}"
-                            ),
-                            value=deepl.Language.__dict__[lang.upper()],
-                        )
-                    )
+            # DeepL only tells English and Portuguese apart by region.
+            language = ctx.locale or "en-US"
+            language = language if language.startswith(("en-", "pt-")) else language[:2]
 
-            await ctx.populate(choices)
+        # a channel subscription or automatic translation may already have it.
+        if shared := self.fanout.get(int(message.id), language):
+            await ctx.send(shared[0], ephemeral=True)
+        elif (result := await self._translate(ctx, text, language)) is not None:
+            await ctx.send(result, ephemeral=True)
+
+    @i.extension_listener(name="on_message_update")
+    async def _update_message(self, *messages: i.Message):
+        # the edited message comes last, after the old one when the library has it.
+        message = messages[-1]
+        self.messages.update(int(message.channel_id), int(message.id), message.content)
+
+    @i.extension_listener(name="on_message_delete")
+    async def _forget_message(self, message: i.Message):
+        self.messages.delete(int(message.channel_id), int(message.id))
+
+    @i.extension_listener(name="on_message_delete_bulk")
+    async def _forget_messages(self, data):
+        if not isinstance(data, dict):
+            data = {"channel_id": data.channel_id, "ids": data.ids}
+
+        self.messages.delete(int(data["channel_id"]), *(int(id) for id in data["ids"]))
 
     @i.extension_listener(name="on_message_create")
+    @src.metrics.traced("auto_translate")
     async def _convert_auto_translate(self, message: i.Message):
         """
         Converts given messages from users to their desired language.
         """
-        db = json.loads(open("./db/translation.json", "r").read())
-        guilds = json.loads(open("./db/guilds.json", "r").read())
-        id: str = str(message.author.id)  # convert Snowflake to str
-
-        for user in db:
-            webhook = i.Webhook()
-
-            if user == id and db[id]["automatic"]:
-                try:
-                    webhook = await webhook.create(
-                        client=self.bot._http,
-                        channel_id=int(message.channel_id),
-                        name="Disword mimicked translation",
-                    )
-                except TypeError:
-                    await self.bot._http.send_message(
-                        channel_id=message.channel_id,
-                        content="Disword is currently going through a webhook rate limit. Please try again later.",
-                    )
-
-                guilds.update({str(message.channel_id): str(webhook.id)})
-                guilds = open("./db/guilds.json", "w").write(
-                    json.dumps(guilds, indent=4, sort_keys=True)
+        if message.content:
+            self.messages.put(int(message.channel_id), int(message.id), message.content)
+
+        # snowflakes carry when Discord created the message, in ms since 2015.
+        created = ((int(message.id) >> 22) + 1420070400000) / 1000
+        src.metrics.observe("gateway", time.time() - created)
+
+        if (
+            message.webhook_id
+            or message.author.bot
+            or not self.store.is_active(int(message.author.id))
+            or not any(char.isalpha() for char in message.content or "")
+        ):
+            return
+
+        user = self.store.get_user(int(message.author.id))
+        segments = src.markup.segment(message.content)
+
+        if not segments.texts:
+            return
+        if self.detector.is_target(
+            " ".join(segments.prose),
+            user.language,
+            int(message.author.id),
+            int(message.channel_id),
+        ):
+            return
+
+        characters = len(message.content) - segments.saved
+
+        if not self.quota.allows(characters, automatic=True):
+            return
+
+        log.debug(f"Kept {segments.saved} characters of message {message.id} from the API.")
+
+        guild_id = int(message.guild_id) if message.guild_id else None
+        delivery = self.delivery.reserve(int(message.channel_id), int(message.id))
+
+        try:
+            with self.quota.paying(guild_id, int(message.author.id)):
+                translations = await self.scheduler.submit(
+                    lambda: self.fanout.translate(int(message.id), segments, [user.language]),
+                    guild_id=guild_id,
                 )
+            text, source_lang = translations[user.language]
+            self.detector.remember(int(message.author.id), int(message.channel_id), source_lang)
 
-                result = self.translator.translate_text(
-                    message.content, target_lang=db[id]["language"].upper()
-                )
-                webhook = await webhook.get(
-                    client=self.bot._http,
-                    webhook_id=guilds[message.channel_id],
+            if source_lang.lower() == user.language.lower().split("-")[0]:
+                return
+
+            self.delivery.fulfil(
+                delivery,
+                text,
+                username=message.author.username,
+                avatar_url=message.author.avatar_url,
+            )
+        except (src.scheduler.SchedulerFull, deepl.TooManyRequestsException):
+            log.debug(f"Shed the automatic translation of message {message.id}.")
+        except (asyncio.TimeoutError, deepl.DeepLException) as error:
+            log.warning(f"Could not translate message {message.id}: {error!r}")
+        finally:
+            self.delivery.cancel(delivery)
+
+    @i.extension_listener(name="on_message_create")
+    @src.metrics.traced("channel_translate")
+    async def _fan_out_channel(self, message: i.Message):
+        """
+        Translates messages sent in subscribed channels to each of their languages.
+        """
+        languages = self.store.get_languages(int(message.channel_id))
+
+        if (
+            not languages
+            or message.webhook_id
+            or message.author.bot
+            or not any(char.isalpha() for char in message.content or "")
+        ):
+            return
+
+        segments = src.markup.segment(message.content)
+
+        if not segments.texts:
+            return
+
+        text = " ".join(segments.prose)
+        languages = [
+            language
+            for language in languages
+            if not self.detector.is_target(
+                text, language, int(message.author.id), int(message.channel_id)
+            )
+        ]
+        characters = (len(message.content) - segments.saved) * len(languages)
+
+        if not languages or not self.quota.allows(characters, automatic=True):
+            return
+
+        guild_id = int(message.guild_id) if message.guild_id else None
+        delivery = self.delivery.reserve(
+            int(message.channel_id), source_id=int(message.id), source=message.content
+        )
+
+        try:
+            # a message going out in several languages weighs that much more in its guild's share.
+            with self.quota.paying(guild_id, int(message.author.id)):
+                translations = await self.scheduler.submit(
+                    lambda: self.fanout.translate(int(message.id), segments, languages),
+                    guild_id=guild_id,
+                    weight=1 / len(languages),
                 )
-                await webhook.execute(
-                    result.text,
+
+            for _, source_lang in translations.values():
+                if source_lang:
+                    self.detector.remember(
+                        int(message.author.id), int(message.channel_id), source_lang
+                    )
+                    break
+
+            if content := self._render(translations):
+                self.delivery.fulfil(
+                    delivery,
+                    content,
                     username=message.author.username,
                     avatar_url=message.author.avatar_url,
                 )
-                await message.delete()
+        except (src.scheduler.SchedulerFull, deepl.TooManyRequestsException):
+            log.debug(f"Shed the channel translation of message {message.id}.")
+        except (asyncio.TimeoutError, deepl.DeepLException) as error:
+            log.warning(f"Could not translate message {message.id}: {error!r}")
+        finally:
+            self.delivery.cancel(delivery)
+
+    @staticmethod
+    def _render(translations: dict[str, src.fanout.Translation]) -> str | None:
+        """Renders the translations of a channel message, a line per language."""
+        lines = [
+            f"**{language}** {text}"
+            for language, (text, source_lang) in translations.items()
+            if (source_lang or "").lower() != language.lower().split("-")[0]
+        ]
+        content = "\n".join(lines)
+        return content if len(content) <= 2000 else content[:1999] + "…"
+
+    @i.extension_listener(name="on_message_update")
+    @src.metrics.traced("edit_translate")
+    async def _retranslate_edit(self, *messages: i.Message):
+        """
+        Edits the translations of an edited message in place, translating only what changed.
+        """
+        message = messages[-1]
+
+        if message.content is None or message.webhook_id:
+            return
+
+        # embeds being added to a message update it too, without changing its content.
+        delivery = await self.delivery.posted(int(message.id))
+
+        if (
+            delivery is None
+            or delivery.source == message.content
+            or not self.quota.allows(0, automatic=True)
+        ):
+            return
+
+        segments = src.markup.segment(message.content)
+        languages = list(self.store.get_languages(int(message.channel_id)))
+
+        if not segments.texts or not languages:
+            return
+
+        guild_id = int(message.guild_id) if message.guild_id else None
+
+        try:
+            with self.quota.paying(guild_id, int(message.author.id)):
+                translations = await self.scheduler.submit(
+                    lambda: self.fanout.translate(
+                        int(message.id), segments, languages, edited=True
+                    ),
+                    guild_id=guild_id,
+                    weight=1 / len(languages),
+                )
+        except (src.scheduler.SchedulerFull, deepl.TooManyRequestsException):
+            log.debug(f"Shed the edit of the translation of message {message.id}.")
+            return
+        except (asyncio.TimeoutError, deepl.DeepLException) as error:
+            log.warning(f"Could not translate the edit of message {message.id}: {error!r}")
+            return
+
+        if content := self._render(translations):
+            await self.delivery.edit(
+                int(message.id), content, message.edited_timestamp, message.content
+            )
 
 
-def setup(bot: i.Client):
-    Translate(bot)
+def setup(bot: i.Client, services: src.services.Services | None = None):
+    Translate(bot, services or src.services.Services())
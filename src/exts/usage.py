@@ -1,22 +1,40 @@
+import asyncio
+import logging
+
 import deepl
 import interactions as i
 from interactions.ext import enhanced
 
-import src.const
+import src.metrics
+import src.services
+
+log = logging.getLogger(__name__)
 
 
 class Usage(enhanced.EnhancedExtension):
     """An extension dedicated to /usage."""
 
-    def __init__(self, bot: i.Client):
+    def __init__(self, bot: i.Client, services: src.services.Services):
         self.bot = bot
-        self.translator = deepl.Translator(src.const.AUTH_KEY)
+        self.services = services
+
+    @i.extension_listener(name="on_ready")
+    async def _start_quota(self):
+        self.services.start()
 
     @enhanced.extension_command()
     @enhanced.autodefer(delay=0)
+    @src.metrics.traced("usage")
     async def usage(self, ctx: i.CommandContext):
         """Provides statistics on the bot's usage."""
-        use: deepl.Usage = self.translator.get_usage()
+        quota = self.services.quota
+
+        if quota.limit is None:
+            try:
+                with src.metrics.stage("reconcile"):
+                    await quota.reconcile(self.services.translator)
+            except (deepl.DeepLException, asyncio.TimeoutError) as error:
+                log.warning(f"Could not get the usage of the API key: {error!r}")
 
         def create_bar(count: int, limit: int, length: int = 10) -> str:
             quota: int | float = count / limit
@@ -31,18 +49,19 @@ class Usage(enhanced.EnhancedExtension):
             bar = bar + f" **{round(quota * 100)}%**"
             return bar
 
-        embed = i.Embed(
-            title="Usage",
-            fields=[
-                i.EmbedField(
-                    name="Character limit",
-                    value=create_bar(use.character.count, use.character.limit)
-                    + f"\n({use.character.count}/{use.character.limit})",
-                )
-            ],
-        )
+        if quota.limit:
+            limit = create_bar(min(quota.count, quota.limit), quota.limit)
+            limit += f"\n({quota.count}/{quota.limit})"
+        else:
+            limit = f"Unknown right now.\n({quota.count} characters counted)"
+
+        embed = i.Embed(title="Usage", fields=[i.EmbedField(name="Character limit", value=limit)])
+
+        if ctx.guild_id and (count := quota.guilds.get(int(ctx.guild_id))):
+            embed.add_field(name="This server", value=f"{count} characters since the bot started.")
+
         await ctx.send(embeds=embed)
 
 
-def setup(bot: i.Client):
-    Usage(bot)
+def setup(bot: i.Client, services: src.services.Services | None = None):
+    Usage(bot, services or src.services.Services())
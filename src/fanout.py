@@ -0,0 +1,155 @@
+"""
+The bot's translation fan-out. This translates a message into
+each language it is wanted in exactly once, however many places
+want it.
+"""
+import asyncio
+import collections
+import contextlib
+import functools
+import logging
+
+import src.batcher
+import src.cache
+import src.markup
+
+log = logging.getLogger(__name__)
+
+# a message's translated text and the language it was detected in.
+Translation = tuple[str, str]
+Key = tuple[int, str]
+
+
+class FanOut:
+    """
+    A shared set of translations, one per message and language.
+
+    Every (message, language) pair maps to one future, so a user's
+    automatic translation, a channel subscription and someone opening the
+    message from the context menu all await the same call. The languages
+    of a message are requested concurrently through the batcher, which
+    groups them with other messages going to the same language.
+
+    Messages are translated line by line, and the texts of the last version
+    of each pair are kept. An edit splits the lines that changed into
+    sentences, so it only sends the sentences that changed. The language
+    a message was detected in is the one most of its text was detected in.
+    The last ``size`` pairs are kept for whoever asks later.
+    """
+
+    def __init__(self, batcher: src.batcher.TranslationBatcher, size: int = 1000):
+        self.batcher = batcher
+        self.size = size
+        self.stats = src.cache.CacheStats()
+        self._translations: collections.OrderedDict[Key, asyncio.Future] = collections.OrderedDict()
+        self._texts: collections.OrderedDict[
+            Key, dict[str, Translation]
+        ] = collections.OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._translations)
+
+    def get(self, message_id: int, language: str) -> Translation | None:
+        """Gets a finished translation of a message, if any."""
+        future = self._translations.get((message_id, language.upper()))
+
+        if future is None or not future.done() or future.cancelled() or future.exception():
+            return None
+
+        return future.result()
+
+    async def _translate(
+        self,
+        key: Key,
+        segments: src.markup.Segments,
+        language: str,
+        previous: asyncio.Future | None = None,
+    ) -> Translation:
+        if previous is not None:
+            # an edit builds on the version before it, so that one has to finish first.
+            with contextlib.suppress(Exception):
+                await asyncio.shield(previous)
+
+        texts = self._texts.get(key, {})
+
+        if previous is not None:
+            # only the lines that changed are split, so the others are reused whole.
+            segments = src.markup.sentences(segments, keep=texts)
+
+        missing = [text for text in dict.fromkeys(segments.texts) if text not in texts]
+        self.stats.saved += sum(len(text) for text in segments.texts if text in texts)
+        results = await asyncio.gather(
+            *(self.batcher.translate(text, language) for text in missing)
+        )
+
+        texts = {text: texts[text] for text in segments.texts if text in texts}
+        texts.update(
+            (text, (result.text, result.detected_source_lang))
+            for text, result in zip(missing, results)
+        )
+        self._texts[key] = texts
+        self._texts.move_to_end(key)
+
+        while len(self._texts) > self.size:
+            self._texts.popitem(last=False)
+
+        detected: collections.Counter[str] = collections.Counter()
+
+        for text in segments.texts:
+            detected[texts[text][1]] += len(text)
+
+        source_lang = detected.most_common(1)[0][0] if detected else None
+        return segments.join([texts[text][0] for text in segments.texts]), source_lang
+
+    def _done(self, key: Key, future: asyncio.Future):
+        # failed translations are forgotten, so the next request tries again.
+        if future.cancelled() or future.exception():
+            if self._translations.get(key) is future:
+                del self._translations[key]
+
+    def _future(
+        self,
+        message_id: int,
+        segments: src.markup.Segments,
+        language: str,
+        edited: bool = False,
+    ) -> asyncio.Future:
+        key = (message_id, language.upper())
+        previous = self._translations.get(key)
+
+        if previous is not None and not edited:
+            self._translations.move_to_end(key)
+            self.stats.hits += 1
+            return previous
+
+        self.stats.misses += 1
+        future = asyncio.ensure_future(self._translate(key, segments, language, previous))
+        future.add_done_callback(functools.partial(self._done, key))
+        self._translations[key] = future
+        self._translations.move_to_end(key)
+
+        while len(self._translations) > self.size:
+            self._translations.popitem(last=False)
+            self.stats.evicted += 1
+
+        return future
+
+    async def translate(
+        self,
+        message_id: int,
+        segments: src.markup.Segments,
+        languages: list[str],
+        edited: bool = False,
+    ) -> dict[str, Translation]:
+        """
+        Translates a message into some languages, sharing whatever is already underway.
+
+        When the message was ``edited``, it is translated again, reusing every
+        line and sentence its last version had in common.
+        """
+        futures = {
+            language: self._future(message_id, segments, language, edited) for language in languages
+        }
+        # one caller giving up must not cancel the translation for everyone else.
+        results = await asyncio.gather(*(asyncio.shield(future) for future in futures.values()))
+        return dict(zip(futures, results))
@@ -0,0 +1,160 @@
+"""
+The bot's language index. This precomputes the languages
+DeepL can translate to for fast autocompletion.
+"""
+import collections
+import logging
+import typing
+
+import attrs
+import deepl
+
+import src.translator
+
+log = logging.getLogger(__name__)
+
+# the source-only variants DeepL rejects as targets.
+_SOURCE_ONLY = {"ENGLISH", "PORTUGUESE"}
+
+
+@attrs.define()
+class LanguageEntry:
+    """Represents a language that can be translated to."""
+
+    name: str = attrs.field()
+    """The name displayed for the language."""
+    code: str = attrs.field()
+    """The code given to the DeepL API."""
+    aliases: tuple[str, ...] = attrs.field(converter=tuple)
+    """Lowercased names and codes the language can be searched by."""
+
+
+def _from_enum() -> list[LanguageEntry]:
+    entries: list[LanguageEntry] = []
+
+    for key, code in vars(deepl.Language).items():
+        if not key.isupper() or not isinstance(code, str) or key in _SOURCE_ONLY:
+            continue
+
+        base, _, variant = key.partition("_")
+        name = base.capitalize() + (f" ({variant.capitalize()})" if variant else "")
+        entries.append(
+            LanguageEntry(name, code, (name.lower(), code.lower(), *key.lower().split("_")))
+        )
+
+    return entries
+
+
+class LanguageIndex:
+    """
+    A ranked index of the languages available to translate to.
+
+    Display names, codes and aliases are computed once, so a query is
+    a single pass over a few dozen precomputed strings. Matches on a code
+    or prefix rank above substring matches, and within each tier the
+    user's recently used languages and locale come first.
+    """
+
+    LIMIT = 25
+
+    def __init__(self, recent: int = 5, users: int = 10000):
+        self.recent = recent
+        self.users = users
+        self._entries: list[LanguageEntry] = []
+        self._codes: dict[str, LanguageEntry] = {}
+        self._recent: collections.OrderedDict[
+            int, collections.deque[str]
+        ] = collections.OrderedDict()
+        self._build(_from_enum())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, code: str) -> bool:
+        return code.lower() in self._codes
+
+    def _build(self, entries: list[LanguageEntry]):
+        self._entries = sorted(entries, key=lambda entry: entry.name)
+        self._codes = {entry.code.lower(): entry for entry in self._entries}
+
+    async def refresh(self, translator: src.translator.AsyncTranslator):
+        """Rebuilds the index from the languages the API currently supports."""
+        languages = await translator.get_target_languages()
+        self._build(
+            [
+                LanguageEntry(
+                    language.name,
+                    language.code,
+                    (
+                        language.name.lower(),
+                        language.code.lower(),
+                        *language.name.lower().replace("(", "").replace(")", "").split(),
+                    ),
+                )
+                for language in languages
+            ]
+        )
+        log.debug(f"Refreshed the language index with {len(self._entries)} languages.")
+
+    def restore(self, load: typing.Callable[[], list | None]):
+        """Rebuilds the index from a snapshot, if it has one."""
+        if entries := load():
+            self._build([LanguageEntry(*entry) for entry in entries])
+
+    def dump(self) -> list[tuple[str, str, tuple[str, ...]]]:
+        """Dumps every language in the index."""
+        return [(entry.name, entry.code, entry.aliases) for entry in self._entries]
+
+    def remember(self, user_id: int, code: str):
+        """Remembers a language as recently used by a user."""
+        recent = self._recent.pop(user_id, None) or collections.deque(maxlen=self.recent)
+
+        if code in recent:
+            recent.remove(code)
+
+        recent.appendleft(code)
+        self._recent[user_id] = recent
+
+        if len(self._recent) > self.users:
+            self._recent.popitem(last=False)
+
+    def _preferred(self, user_id: int | None, locale: str | None) -> dict[str, int]:
+        preferred: dict[str, int] = {}
+
+        for rank, code in enumerate(self._recent.get(user_id, ())):
+            preferred[code.lower()] = rank
+
+        if locale:
+            for code in (locale.lower(), locale.lower().split("-")[0]):
+                if code in self._codes:
+                    preferred.setdefault(code, len(preferred))
+                    break
+
+        return preferred
+
+    def search(
+        self, query: str = "", user_id: int | None = None, locale: str | None = None
+    ) -> list[LanguageEntry]:
+        """Searches for languages, best matches first, up to Discord's limit of choices."""
+        query = query.strip().lower()
+        preferred = self._preferred(user_id, locale)
+        ranked: list[tuple[int, int, str, LanguageEntry]] = []
+
+        for entry in self._entries:
+            if not query:
+                tier = 0
+            elif query == entry.code.lower():
+                tier = 0
+            elif any(alias.startswith(query) for alias in entry.aliases):
+                tier = 1
+            elif query in entry.aliases[0]:
+                tier = 2
+            else:
+                continue
+
+            ranked.append(
+                (tier, preferred.get(entry.code.lower(), len(preferred)), entry.name, entry)
+            )
+
+        ranked.sort(key=lambda item: item[:3])
+        return [entry for *_, entry in ranked[: self.LIMIT]]
@@ -0,0 +1,253 @@
+"""
+The bot's logging pipeline. This hands log records to a background
+thread to be formatted and written, so the event loop only pays for
+deciding whether a record is kept and putting it on a queue.
+"""
+import atexit
+import contextlib
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+import typing
+
+import attrs
+
+# the levels of noisy libraries in production, unless overridden.
+LEVELS = {
+    "interactions": logging.WARNING,
+    "deepl": logging.WARNING,
+    "aiohttp.access": logging.WARNING,
+    "asyncio": logging.WARNING,
+}
+
+_context: contextvars.ContextVar[dict[str, typing.Any]] = contextvars.ContextVar(
+    "log_context", default={}
+)
+
+
+@attrs.define()
+class LogStats:
+    """Represents the counters of the logging pipeline."""
+
+    queued: int = attrs.field(default=0)
+    """How many records were handed to the background thread."""
+    suppressed: int = attrs.field(default=0)
+    """How many records were dropped by rate limiting and sampling."""
+    dropped: int = attrs.field(default=0)
+    """How many records were dropped because the queue was full."""
+    seconds: float = attrs.field(default=0.0)
+    """How long the calling threads spent logging, rate limiting and queuing."""
+
+
+STATS = LogStats()
+
+
+@contextlib.contextmanager
+def bind(**fields):
+    """Adds fields to every record logged inside the block, and the tasks it starts."""
+    token = _context.set(_context.get() | fields)
+
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def describe(obj) -> dict[str, int]:
+    """Gets the IDs worth logging of an interaction context or a message."""
+    fields = {}
+
+    for name in ("guild_id", "channel_id"):
+        if (value := getattr(obj, name, None)) is not None:
+            fields[name] = int(value)
+
+    if (id := getattr(obj, "id", None)) is not None:
+        # only interactions carry a token to respond with.
+        fields["interaction_id" if getattr(obj, "token", None) else "message_id"] = int(id)
+
+    return fields
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through at most ``burst`` records from each line of code every
+    ``window`` seconds, and one in ``sample`` past that.
+
+    Errors are always let through. The first record let through in a new
+    window carries how many were suppressed in the last one.
+    """
+
+    def __init__(self, burst: int = 10, window: float = 60.0, sample: int = 100):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.sample = sample
+        self._windows: dict[tuple[str, int], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR:
+            return True
+
+        now = time.monotonic()
+        key = (record.pathname, record.lineno)
+        window = self._windows.get(key)
+
+        if window is None or window[0] + self.window < now:
+            suppressed = window[2] if window else 0
+            window = self._windows[key] = [now, 0, 0]
+
+            if suppressed:
+                record.suppressed = suppressed
+
+        window[1] += 1
+
+        if window[1] <= self.burst or (window[1] - self.burst) % self.sample == 0:
+            return True
+
+        window[2] += 1
+        STATS.suppressed += 1
+        return False
+
+
+class ContextFilter(logging.Filter):
+    """Copies the bound fields onto every record, as they are on the thread logging it."""
+
+    def __init__(self, **fields):
+        super().__init__()
+        self.fields = fields
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.context = self.fields | _context.get()
+        return True
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """
+    A handler putting records on a bounded queue without ever blocking.
+
+    Only the message itself is rendered before queuing, so arguments
+    that change later cannot change it. Everything else is formatted on
+    the listener's thread. When the queue is full, records are dropped.
+    """
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        start = time.perf_counter()
+
+        try:
+            return super().handle(record)
+        finally:
+            STATS.seconds += time.perf_counter() - start
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            STATS.queued += 1
+        except queue.Full:
+            STATS.dropped += 1
+
+
+class TextFormatter(logging.Formatter):
+    """Formats records as lines of text, with their fields at the end."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = dict(getattr(record, "context", {}))
+
+        if suppressed := getattr(record, "suppressed", None):
+            fields["suppressed"] = suppressed
+
+        if fields:
+            line += " " + " ".join(f"{name}={value}" for name, value in fields.items())
+
+        return line
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **getattr(record, "context", {}),
+        }
+
+        if suppressed := getattr(record, "suppressed", None):
+            entry["suppressed"] = suppressed
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+
+        return json.dumps(entry, default=str)
+
+
+def parse(levels: str) -> dict[str, int]:
+    """Parses levels per logger, written as ``name=LEVEL,name=LEVEL``."""
+    parsed = {}
+
+    for pair in levels.split(","):
+        name, _, level = pair.strip().partition("=")
+
+        if name and level:
+            parsed[name.strip()] = logging.getLevelName(level.strip().upper())
+
+    return parsed
+
+
+def setup(
+    level: str = "INFO",
+    levels: dict[str, int] | None = None,
+    format: str = "text",
+    size: int = 10000,
+    burst: int = 10,
+    window: float = 60.0,
+    sample: int = 100,
+    **fields,
+) -> logging.handlers.QueueListener:
+    """
+    Routes every record through the pipeline, replacing the root logger's handlers.
+
+    ``levels`` are applied on top of the production defaults in ``LEVELS``,
+    and ``fields`` are added to every record. Gets the listener writing
+    records, which flushes what is left when the process exits.
+    """
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(JSONFormatter() if format == "json" else TextFormatter())
+    handler = AsyncQueueHandler(queue.Queue(size))
+    handler.addFilter(RateLimitFilter(burst, window, sample))
+    handler.addFilter(ContextFilter(**fields))
+
+    root = logging.getLogger()
+
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+    for name, value in (LEVELS | (levels or {})).items():
+        logging.getLogger(name).setLevel(value)
+
+    listener = logging.handlers.QueueListener(handler.queue, stream)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,143 @@
+"""
+The bot's markup protection. This swaps the markup of Discord
+messages for placeholder tags DeepL leaves alone, so only their
+translatable text is ever translated.
+"""
+import re
+import typing
+import xml.sax.saxutils
+
+import attrs
+
+SKIP = re.compile(
+    r"```.*?```"  # code blocks
+    r"|`[^`\n]+`"  # inline code
+    r"|<(?:@[!&]?|#)\d+>"  # user, role and channel mentions
+    r"|</[\w -]+:\d+>"  # command mentions
+    r"|<a?:\w+:\d+>"  # custom emoji
+    r"|<t:-?\d+(?::[tTdDfFR])?>"  # timestamps
+    r"|<?https?://[^\s>]+>?"  # links, suppressed or not
+    r"|@(?:everyone|here)",
+    re.DOTALL,
+)
+SENTENCE = re.compile(r"(?<=[.!?\u3002\uff01\uff1f])(\s+)")
+LINE = re.compile(r"(\s*\n\s*)")
+
+# the placeholder standing in for a piece of markup, by its number.
+TAG = "x"
+PLACEHOLDER = re.compile(rf'<{TAG} i="(\d+)"\s*/>')
+# what every text of a segmented message has to be translated with.
+OPTIONS = {"tag_handling": "xml", "ignore_tags": [TAG]}
+
+_RESTORE = re.compile(rf"{PLACEHOLDER.pattern}|&(amp|lt|gt|quot|apos);")
+_ENTITIES = {"amp": "&", "lt": "<", "gt": ">", "quot": '"', "apos": "'"}
+
+
+@attrs.define()
+class Segments:
+    """
+    Represents a message split into lines of XML to translate and what is kept as is.
+
+    Markup inside a line is replaced by a numbered placeholder tag, so the
+    line is translated whole and the markup put back where DeepL moved it.
+    """
+
+    parts: list[str] = attrs.field(factory=list)
+    """Every part of the message, in order, escaped as XML."""
+    translatable: list[int] = attrs.field(factory=list)
+    """The index of each part to translate."""
+    markup: list[str] = attrs.field(factory=list)
+    """The markup each placeholder stands for."""
+
+    @property
+    def texts(self) -> list[str]:
+        """The texts to send to the API."""
+        return [self.parts[index] for index in self.translatable]
+
+    @property
+    def prose(self) -> list[str]:
+        """The texts as they read, without their markup."""
+        return [xml.sax.saxutils.unescape(PLACEHOLDER.sub("", text)) for text in self.texts]
+
+    @property
+    def saved(self) -> int:
+        """How many characters are kept from the API."""
+        return len(self.join(self.texts)) - sum(len(text) for text in self.prose)
+
+    def join(self, translations: list[str]) -> str:
+        """Puts the translations of the texts back in between the markup."""
+        parts = self.parts.copy()
+
+        for index, translation in zip(self.translatable, translations):
+            parts[index] = translation
+
+        return _RESTORE.sub(
+            lambda match: self.markup[int(match[1])] if match[1] else _ENTITIES[match[2]],
+            "".join(parts),
+        )
+
+
+def _split(segments: Segments, text: str, pattern: re.Pattern):
+    # the split alternates pieces and the whitespace after them.
+    for position, piece in enumerate(pattern.split(text)):
+        if position % 2 == 0 and any(char.isalpha() for char in PLACEHOLDER.sub("", piece)):
+            segments.translatable.append(len(segments.parts))
+        if piece:
+            segments.parts.append(piece)
+
+
+def segment(text: str) -> Segments:
+    """
+    Replaces the markup of a message with placeholders, line by line.
+
+    Code, mentions, emoji, timestamps and links become placeholders, and
+    the line breaks and whitespace around each line are kept apart, so
+    lines without any letters are never sent. A message made up only of
+    markup has nothing to translate.
+    """
+    segments = Segments()
+    pieces = []
+    position = 0
+
+    for match in SKIP.finditer(text):
+        pieces.append(xml.sax.saxutils.escape(text[position : match.start()]))
+        pieces.append(f'<{TAG} i="{len(segments.markup)}"/>')
+        segments.markup.append(match.group())
+        position = match.end()
+
+    pieces.append(xml.sax.saxutils.escape(text[position:]))
+    body = "".join(pieces)
+    leading = body[: len(body) - len(body.lstrip())]
+    trailing = body[len(body.rstrip()) :] if body.strip() else ""
+
+    if leading:
+        segments.parts.append(leading)
+
+    _split(segments, body.strip(), LINE)
+
+    if trailing:
+        segments.parts.append(trailing)
+
+    return segments
+
+
+def sentences(segments: Segments, keep: typing.Container[str] = ()) -> Segments:
+    """
+    Splits every text of a segmented message into its sentences, except those to ``keep``.
+
+    The whitespace between sentences is kept as is, so an edit that
+    changes one sentence leaves the others to be reused word for word.
+    """
+    result = Segments(markup=segments.markup)
+    translatable = set(segments.translatable)
+
+    for index, part in enumerate(segments.parts):
+        if index in translatable and part in keep:
+            result.translatable.append(len(result.parts))
+            result.parts.append(part)
+        elif index in translatable:
+            _split(result, part, SENTENCE)
+        else:
+            result.parts.append(part)
+
+    return result
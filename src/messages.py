@@ -0,0 +1,135 @@
+"""
+The bot's message cache. This remembers the content of recent
+messages seen on the gateway, so translating one by its ID
+rarely needs a REST call.
+"""
+import asyncio
+import collections
+import logging
+import time
+
+import src.cache
+
+log = logging.getLogger(__name__)
+
+# the content of a message and when it was last seen.
+Entry = tuple[str, float]
+
+
+class MessageCache:
+    """
+    A bounded ring buffer of recent message contents per channel.
+
+    Each channel keeps its last ``size`` messages, and no message is kept
+    for longer than ``age`` seconds. Past ``limit`` bytes of content in
+    total, messages are dropped from whichever channel has been quiet the
+    longest. Edits replace the content and deletes drop it.
+    """
+
+    def __init__(self, size: int = 200, age: float = 3600.0, limit: int = 8388608):
+        self.size = size
+        self.age = age
+        self.limit = limit
+        self.stats = src.cache.CacheStats()
+        self.bytes = 0
+        self._channels: collections.OrderedDict[
+            int, collections.OrderedDict[int, Entry]
+        ] = collections.OrderedDict()
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return sum(len(messages) for messages in self._channels.values())
+
+    def _drop(self, messages: collections.OrderedDict[int, Entry], message_id: int | None = None):
+        if message_id is None:
+            _, (content, _) = messages.popitem(last=False)
+        else:
+            content, _ = messages.pop(message_id)
+
+        self.bytes -= len(content.encode())
+
+    def put(self, channel_id: int, message_id: int, content: str):
+        """Remembers the content of a message, replacing any it had."""
+        messages = self._channels.setdefault(channel_id, collections.OrderedDict())
+        self._channels.move_to_end(channel_id)
+
+        if message_id in messages:
+            self._drop(messages, message_id)
+
+        messages[message_id] = (content, time.monotonic())
+        self.bytes += len(content.encode())
+
+        while len(messages) > self.size:
+            self._drop(messages)
+            self.stats.evicted += 1
+
+        while self.bytes > self.limit and self._channels:
+            oldest_id, oldest = next(iter(self._channels.items()))
+            self._drop(oldest)
+            self.stats.evicted += 1
+
+            if not oldest:
+                del self._channels[oldest_id]
+
+    def update(self, channel_id: int, message_id: int, content: str | None):
+        """Replaces the content of an edited message, if it has any."""
+        if content is not None:
+            self.put(channel_id, message_id, content)
+
+    def delete(self, channel_id: int, *message_ids: int):
+        """Forgets deleted messages."""
+        if (messages := self._channels.get(channel_id)) is None:
+            return
+
+        for message_id in message_ids:
+            if message_id in messages:
+                self._drop(messages, message_id)
+
+        if not messages:
+            del self._channels[channel_id]
+
+    def get(self, channel_id: int, message_id: int) -> str | None:
+        """Gets the content of a message, counting the hit or miss."""
+        messages = self._channels.get(channel_id)
+        entry = messages.get(message_id) if messages else None
+
+        if entry is not None and entry[1] + self.age < time.monotonic():
+            self._drop(messages, message_id)
+            self.stats.expired += 1
+            entry = None
+
+        if entry is None:
+            self.stats.misses += 1
+            return None
+
+        self.stats.hits += 1
+        return entry[0]
+
+    def sweep(self):
+        """Drops every message older than ``age``."""
+        expired = time.monotonic() - self.age
+
+        for channel_id, messages in list(self._channels.items()):
+            # messages are seen in order, so the oldest are always first.
+            while messages and next(iter(messages.values()))[1] < expired:
+                self._drop(messages)
+                self.stats.expired += 1
+
+            if not messages:
+                del self._channels[channel_id]
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self.age / 4)
+            self.sweep()
+
+    def start(self):
+        """Starts sweeping old messages on the running loop, if not already started."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._sweep())
+
+    def close(self):
+        """Stops sweeping old messages."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
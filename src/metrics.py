@@ -0,0 +1,362 @@
+"""
+The bot's metrics. This keeps counters, gauges and latency histograms
+of the hot paths, and serves them in the Prometheus text format.
+"""
+import asyncio
+import bisect
+import contextlib
+import contextvars
+import functools
+import logging
+import math
+import time
+import typing
+
+from aiohttp import web
+
+import src.logs
+
+log = logging.getLogger(__name__)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# the values of a metric's labels, in the order they were declared.
+Labels = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(names: typing.Sequence[str], values: Labels) -> str:
+    if not names:
+        return ""
+
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Metric:
+    """
+    A named metric with a fixed set of labels.
+
+    When a ``function`` is given, the values are read from it on every
+    scrape instead, as a mapping of label values to numbers.
+    """
+
+    TYPE = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: typing.Sequence[str] = (),
+        function: typing.Callable[[], dict[Labels, float]] | None = None,
+    ):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.function = function
+        self._values: dict[Labels, float] = {}
+
+    def _key(self, labels: dict[str, typing.Any]) -> Labels:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def values(self) -> dict[Labels, float]:
+        """Gets the current value of every set of labels."""
+        return self.function() if self.function else dict(self._values)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.TYPE}"]
+
+        for labels, value in self.values().items():
+            lines.append(f"{self.name}{_format(self.labels, labels)} {value}")
+
+        return lines
+
+
+class Counter(Metric):
+    """A metric that only ever goes up."""
+
+    TYPE = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    """A metric that is set to whatever it currently is."""
+
+    TYPE = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    """A metric counting observations into cumulative buckets."""
+
+    TYPE = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: typing.Sequence[str] = (),
+        buckets: typing.Sequence[float] = BUCKETS,
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: dict[Labels, list[int]] = {}
+        self._sums: dict[Labels, float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[key] = self._sums.get(key, 0.0) + value
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observes how long the block inside takes."""
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.TYPE}"]
+        names = self.labels + ("le",)
+
+        for labels, counts in self._counts.items():
+            total = 0
+
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                total += count
+                le = "+Inf" if bound == math.inf else repr(bound)
+                lines.append(f"{self.name}_bucket{_format(names, labels + (le,))} {total}")
+
+            lines.append(f"{self.name}_sum{_format(self.labels, labels)} {self._sums[labels]}")
+            lines.append(f"{self.name}_count{_format(self.labels, labels)} {total}")
+
+        return lines
+
+
+class Registry:
+    """A collection of metrics, rendered together on every scrape."""
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        """Adds a metric, replacing any of the same name."""
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Metric | None:
+        """Gets a metric by its name, if registered."""
+        return self._metrics.get(name)
+
+    def counter(self, name: str, help: str, labels: typing.Sequence[str] = (), **kwargs) -> Counter:
+        return self.register(Counter(name, help, labels, **kwargs))
+
+    def gauge(self, name: str, help: str, labels: typing.Sequence[str] = (), **kwargs) -> Gauge:
+        return self.register(Gauge(name, help, labels, **kwargs))
+
+    def histogram(
+        self, name: str, help: str, labels: typing.Sequence[str] = (), **kwargs
+    ) -> Histogram:
+        return self.register(Histogram(name, help, labels, **kwargs))
+
+    def render(self) -> str:
+        lines = []
+
+        for metric in list(self._metrics.values()):
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                log.exception(f"Could not collect metric {metric.name}.")
+
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+COMMANDS = REGISTRY.counter(
+    "disword_commands_total", "Commands and events handled.", ["command", "outcome"]
+)
+COMMAND_SECONDS = REGISTRY.histogram(
+    "disword_command_seconds", "How long commands and events take.", ["command"]
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "disword_stage_seconds", "How long each stage of a command takes.", ["command", "stage"]
+)
+LOOP_LAG = REGISTRY.gauge("disword_loop_lag_seconds", "How late the event loop last woke up.")
+DISCORD_SECONDS = REGISTRY.histogram(
+    "disword_discord_seconds", "How long calls to Discord take.", ["call"]
+)
+DELIVERY_SECONDS = REGISTRY.histogram(
+    "disword_delivery_seconds", "How long translations wait in the delivery queue until sent."
+)
+LOG_RECORDS = REGISTRY.counter(
+    "disword_log_records_total",
+    "Log records queued for writing, or dropped before.",
+    ["outcome"],
+    function=lambda: {
+        ("queued",): src.logs.STATS.queued,
+        ("suppressed",): src.logs.STATS.suppressed,
+        ("dropped",): src.logs.STATS.dropped,
+    },
+)
+LOG_SECONDS = REGISTRY.counter(
+    "disword_log_seconds_total",
+    "How long the event loop has spent handing log records to the logging thread.",
+    function=lambda: {(): src.logs.STATS.seconds},
+)
+
+
+class Trace:
+    """
+    Represents the stages of one command or event as it runs.
+
+    Every stage is observed in ``STAGE_SECONDS``. When ``enabled``, the
+    spans of each trace are also logged once it finishes.
+    """
+
+    enabled: bool = False
+
+    def __init__(self, command: str):
+        self.command = command
+        self.start = time.perf_counter()
+        self.spans: list[tuple[str, float, float]] = []
+
+    def observe(self, stage: str, seconds: float, offset: float | None = None):
+        """Records a stage that has already been timed."""
+        STAGE_SECONDS.observe(seconds, command=self.command, stage=stage)
+
+        if self.enabled:
+            if offset is None:
+                offset = time.perf_counter() - self.start - seconds
+
+            self.spans.append((stage, offset, seconds))
+
+    @contextlib.contextmanager
+    def stage(self, stage: str):
+        """Times the block inside as a stage of the trace."""
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, start - self.start)
+
+    def finish(self, outcome: str):
+        seconds = time.perf_counter() - self.start
+        COMMANDS.inc(command=self.command, outcome=outcome)
+        COMMAND_SECONDS.observe(seconds, command=self.command)
+
+        if self.enabled:
+            spans = " ".join(
+                f"{stage}=+{offset * 1000:.1f}/{duration * 1000:.1f}ms"
+                for stage, offset, duration in self.spans
+            )
+            log.info(f"{self.command} {outcome} in {seconds * 1000:.1f}ms: {spans}")
+
+
+_current: contextvars.ContextVar[Trace | None] = contextvars.ContextVar("trace", default=None)
+
+
+def traced(command: str):
+    """Traces every call of a coroutine function as ``command``."""
+
+    def decorator(coro):
+        @functools.wraps(coro)
+        async def wrapper(*args, **kwargs):
+            trace = Trace(command)
+            token = _current.set(trace)
+            outcome = "error"
+            # the context or message it handles, for its records to say which.
+            subject = next((arg for arg in args if hasattr(arg, "guild_id")), None)
+
+            try:
+                with src.logs.bind(command=command, **src.logs.describe(subject)):
+                    result = await coro(*args, **kwargs)
+                outcome = "ok"
+                return result
+            except asyncio.CancelledError:
+                outcome = "cancelled"
+                raise
+            finally:
+                _current.reset(token)
+                trace.finish(outcome)
+
+        return wrapper
+
+    return decorator
+
+
+def stage(name: str) -> typing.ContextManager:
+    """Times the block inside as a stage of the current trace, if any."""
+    trace = _current.get()
+    return trace.stage(name) if trace else contextlib.nullcontext()
+
+
+def observe(name: str, seconds: float):
+    """Records a stage of the current trace that has already been timed, if any."""
+    if trace := _current.get():
+        trace.observe(name, seconds)
+
+
+class MetricsServer:
+    """
+    A local HTTP endpoint serving a registry at ``/metrics``.
+
+    While running, it also measures how late the event loop wakes up
+    from a sleep of ``interval`` seconds into ``LOOP_LAG``.
+    """
+
+    def __init__(
+        self,
+        registry: Registry = REGISTRY,
+        host: str = "127.0.0.1",
+        port: int = 9108,
+        interval: float = 1.0,
+    ):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self._runner = None
+        self._task: asyncio.Task | None = None
+
+    async def _metrics(self, request):
+        return web.Response(text=self.registry.render(), content_type="text/plain", charset="utf-8")
+
+    async def _monitor(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            LOOP_LAG.set(max(0.0, time.perf_counter() - start - self.interval))
+
+    async def start(self):
+        """Starts serving on the running loop, if not already started."""
+        if self._runner is not None:
+            return
+
+        app = web.Application()
+        app.router.add_get("/metrics", self._metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self._task = asyncio.get_running_loop().create_task(self._monitor())
+        log.debug(f"Serving metrics on http://{self.host}:{self.port}/metrics.")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
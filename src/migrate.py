@@ -0,0 +1,53 @@
+"""
+The bot's migration tool. This imports the JSON databases
+into the SQLite storage backend in one go.
+"""
+import argparse
+import logging
+import sys
+
+import attrs
+
+sys.path.append("..")
+
+import src.store
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger()
+
+
+def migrate(source: src.store.Backend, target: src.store.Backend) -> tuple[int, int, int]:
+    """Copies every user, channel and subscription from one backend to another in a single save."""
+    users, channels, subscriptions = source.load()
+    target.save(
+        {user.id: attrs.astuple(user) for user in users},
+        dict(channels),
+        dict(subscriptions),
+    )
+    return len(users), len(channels), len(subscriptions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Imports the JSON databases into SQLite.")
+    parser.add_argument("--users", default="./db/translation.json")
+    parser.add_argument("--channels", default="./db/guilds.json")
+    parser.add_argument("--subscriptions", default="./db/subscriptions.json")
+    parser.add_argument("--database", default="./db/disword.sqlite3")
+    args = parser.parse_args()
+
+    source = src.store.JSONBackend(args.users, args.channels, args.subscriptions)
+    target = src.store.SQLiteBackend(args.database)
+
+    try:
+        users, channels, subscriptions = migrate(source, target)
+    finally:
+        target.close()
+
+    log.info(
+        f"Migrated {users} users, {channels} channels and {subscriptions} subscriptions "
+        f"into {args.database}."
+    )
+
+
+if __name__ == "__main__":
+    main()
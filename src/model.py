@@ -10,7 +10,7 @@ import attrs
 class TranslationUser:
     """Represents a user's state when running translations."""
 
-    id: str = attrs.field()
+    id: int = attrs.field(converter=int)
     """The ID of the user."""
     language: str = attrs.field()
     """The selected language for the user."""
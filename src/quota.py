@@ -0,0 +1,119 @@
+"""
+The bot's quota ledger. This counts billed characters locally
+so usage and budgets never wait on the DeepL API.
+"""
+import asyncio
+import collections
+import contextlib
+import contextvars
+import logging
+import time
+import typing
+
+import deepl
+
+log = logging.getLogger(__name__)
+
+# the guild and user whatever is translated in a context is billed to.
+PAYER: contextvars.ContextVar[tuple[int | None, int | None]] = contextvars.ContextVar(
+    "payer", default=(None, None)
+)
+
+
+class QuotaLedger:
+    """
+    A local ledger of the characters billed by DeepL.
+
+    Characters sent to the API are added to the last count reported by
+    ``get_usage``, which is reconciled every ``interval`` seconds. Once the
+    count passes ``soft`` of the limit automatic translations are rejected,
+    and past ``hard`` every translation is. The characters billed are
+    also attributed to the guild and user they were translated for, so
+    cached translations count for no one.
+    """
+
+    def __init__(self, soft: float = 0.9, hard: float = 0.98, interval: float = 600.0):
+        self.soft = soft
+        self.hard = hard
+        self.interval = interval
+        self.count: int = 0
+        self.limit: int | None = None
+        self.reconciled: float | None = None
+        self.guilds: collections.Counter[int] = collections.Counter()
+        self.users: collections.Counter[int] = collections.Counter()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def quota(self) -> float:
+        """The share of the character limit used, or 0 if it is not known yet."""
+        return self.count / self.limit if self.limit else 0.0
+
+    def restore(self, load: typing.Callable[[], dict | None]):
+        """Restores the last count and limit from a snapshot, until reconciled."""
+        if (state := load()) and self.reconciled is None:
+            self.count, self.limit, self.reconciled = (
+                state["count"],
+                state["limit"],
+                state["reconciled"],
+            )
+
+    def dump(self) -> dict:
+        """Dumps the count and limit."""
+        return {"count": self.count, "limit": self.limit, "reconciled": self.reconciled}
+
+    def bill(self, characters: int):
+        """Adds characters sent to the API to the count."""
+        self.count += characters
+
+    def record(self, characters: int, guild_id: int | None = None, user_id: int | None = None):
+        """Attributes characters billed to a guild and a user."""
+        if guild_id is not None:
+            self.guilds[guild_id] += characters
+        if user_id is not None:
+            self.users[user_id] += characters
+
+    @staticmethod
+    @contextlib.contextmanager
+    def paying(guild_id: int | None, user_id: int | None):
+        """Bills what is translated in the block, and the tasks it starts, to a guild and user."""
+        token = PAYER.set((guild_id, user_id))
+
+        try:
+            yield
+        finally:
+            PAYER.reset(token)
+
+    def allows(self, characters: int, automatic: bool = False) -> bool:
+        """Checks whether a translation of some characters fits within the budgets."""
+        if not self.limit:
+            return True
+
+        quota = (self.count + characters) / self.limit
+        return quota < (self.soft if automatic else self.hard)
+
+    async def reconcile(self, translator):
+        """Replaces the local count with the one reported by the API."""
+        usage: deepl.Usage = await translator.get_usage()
+        self.count = usage.character.count
+        self.limit = usage.character.limit
+        self.reconciled = time.time()
+
+    async def _reconcile_loop(self, translator):
+        while True:
+            try:
+                await self.reconcile(translator)
+            except (deepl.DeepLException, asyncio.TimeoutError):
+                log.debug("Could not reconcile the quota ledger, keeping the local count.")
+
+            await asyncio.sleep(self.interval)
+
+    def start(self, translator):
+        """Starts reconciling with the API of a translator on the running loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._reconcile_loop(translator))
+
+    def close(self):
+        """Stops reconciling with the API."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
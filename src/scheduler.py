@@ -0,0 +1,232 @@
+"""
+The bot's translation scheduler. This decides which translation
+reaches the DeepL API next, so no guild can starve the others.
+"""
+import asyncio
+import collections
+import contextvars
+import heapq
+import itertools
+import logging
+import time
+import typing
+
+import attrs
+import deepl
+
+import src.metrics
+
+log = logging.getLogger(__name__)
+
+
+class SchedulerFull(Exception):
+    """An error raised when a translation is shed because too many are queued."""
+
+
+@attrs.define()
+class Job:
+    """Represents a translation waiting for its turn."""
+
+    func: typing.Callable[[], typing.Awaitable] = attrs.field()
+    """Makes the awaitable doing the translation."""
+    future: asyncio.Future = attrs.field()
+    """Resolved with the result of the translation."""
+    guild_id: int | None = attrs.field(default=None)
+    """The ID of the guild the translation is for."""
+    interactive: bool = attrs.field(default=False)
+    """Whether someone is waiting on a command for the translation."""
+    tag: float = attrs.field(default=0.0)
+    """The virtual finish time of the translation in its guild's queue."""
+    attempts: int = attrs.field(default=0)
+    """How many times the translation was rate limited."""
+    submitted: float = attrs.field(factory=time.perf_counter)
+    """When the translation was submitted."""
+    context: contextvars.Context = attrs.field(factory=contextvars.copy_context)
+    """The context the translation was submitted from, which it runs in."""
+
+
+class Scheduler:
+    """
+    A weighted fair queuing scheduler per guild, with a token bucket
+    for the API.
+
+    Up to ``concurrency`` translations run at once. Interactive commands
+    always go first. Automatic ones are ordered by their virtual finish
+    time in their guild's queue, so each guild with a backlog gets its
+    fair share no matter how much it sends. Guilds may queue up to
+    ``queue`` translations and everyone ``total``, past which new ones
+    are shed.
+
+    Running translations only spend a token when they actually send a
+    request (see ``acquire``), so cached and batched ones cost nothing.
+    Requests are sent at ``rate`` per second with bursts of up to
+    ``burst``, and the backlog waits its turn here when they are not.
+    The SDK retries rate-limited requests on its own, and once it gives
+    up, the bucket pauses with an exponential backoff and the translation
+    is retried up to ``retries`` times.
+    """
+
+    def __init__(
+        self,
+        rate: float = 10.0,
+        burst: int = 20,
+        queue: int = 50,
+        total: int = 1000,
+        retries: int = 3,
+        concurrency: int = 100,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.queue = queue
+        self.total = total
+        self.retries = retries
+        self.concurrency = concurrency
+        self._running = 0
+        self._interactive: collections.deque[Job] = collections.deque()
+        self._background: list[tuple[float, int, Job]] = []
+        self._queued: collections.Counter[int | None] = collections.Counter()
+        self._finish: dict[int | None, float] = {}
+        self._virtual: float = 0.0
+        self._sequence = itertools.count()
+        self._tokens: float = float(burst)
+        self._updated: float = time.monotonic()
+        self._paused_until: float = 0.0
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._interactive) + len(self._background)
+
+    async def submit(
+        self,
+        func: typing.Callable[[], typing.Awaitable],
+        guild_id: int | None = None,
+        interactive: bool = False,
+        weight: float = 1.0,
+    ):
+        """
+        Waits for the turn of a translation, then awaits and returns it.
+
+        Raises ``SchedulerFull`` if the translation had to be shed.
+        """
+        if len(self) >= self.total or self._queued[guild_id] >= self.queue:
+            raise SchedulerFull("Too many translations are waiting.")
+
+        self._start()
+        job = Job(func, asyncio.get_running_loop().create_future(), guild_id, interactive)
+        self._queued[guild_id] += 1
+
+        if interactive:
+            self._interactive.append(job)
+        else:
+            job.tag = max(self._virtual, self._finish.get(guild_id, 0.0)) + 1 / weight
+            self._finish[guild_id] = job.tag
+            heapq.heappush(self._background, (job.tag, next(self._sequence), job))
+
+        self._wakeup.set()
+        return await job.future
+
+    def _pop(self) -> Job | None:
+        while self._interactive or self._background:
+            if self._interactive:
+                job = self._interactive.popleft()
+            else:
+                *_, job = heapq.heappop(self._background)
+                self._virtual = max(self._virtual, job.tag)
+
+            self._queued[job.guild_id] -= 1
+
+            if not self._queued[job.guild_id]:
+                del self._queued[job.guild_id]
+                self._finish.pop(job.guild_id, None)
+            if not job.future.done():
+                return job
+
+        return None
+
+    def _refill(self) -> float:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return now
+
+    async def acquire(self):
+        """Waits until a request can be sent to the API, spending a token on it."""
+        while True:
+            now = self._refill()
+
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+            elif self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+            else:
+                self._tokens -= 1
+                return
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            if not len(self) or self._running >= self.concurrency:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+
+            if job := self._pop():
+                self._running += 1
+                job.context.run(loop.create_task, self._run(job))
+
+    def _requeue(self, job: Job):
+        self._queued[job.guild_id] += 1
+
+        if job.interactive:
+            self._interactive.appendleft(job)
+        else:
+            heapq.heappush(self._background, (job.tag, next(self._sequence), job))
+
+        self._wakeup.set()
+
+    async def _run(self, job: Job):
+        src.metrics.observe("queue", time.perf_counter() - job.submitted)
+
+        try:
+            with src.metrics.stage("deepl"):
+                result = await job.func()
+        except deepl.TooManyRequestsException as error:
+            job.attempts += 1
+            backoff = 2**job.attempts
+            self._paused_until = max(self._paused_until, time.monotonic() + backoff)
+            log.debug(f"DeepL is rate limiting us, pausing for {backoff} seconds.")
+
+            if job.attempts <= self.retries:
+                self._requeue(job)
+            elif not job.future.done():
+                job.future.set_exception(error)
+        except Exception as error:
+            if not job.future.done():
+                job.future.set_exception(error)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._running -= 1
+            self._wakeup.set()
+
+    def _start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._dispatch())
+
+    def close(self):
+        """Stops dispatching, failing whatever is still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        while job := self._pop():
+            job.future.set_exception(SchedulerFull("The scheduler has been closed."))
@@ -0,0 +1,108 @@
+"""
+The bot's shared services. This builds the translator and the
+state around it once, for every extension to share.
+"""
+import functools
+import typing
+
+import src.cache
+import src.const
+import src.quota
+import src.scheduler
+import src.snapshot
+import src.translator
+
+
+class Services:
+    """
+    The services shared by every extension.
+
+    Each one is built the first time an extension asks for it, so an
+    extension that is never loaded never pays for what only it needs.
+    When the bot runs as one of several ``shards``, whatever is stored
+    is shared with the other processes.
+    """
+
+    def __init__(self, shard: int = 0, shards: int = 1):
+        self.shard = shard
+        self.shards = shards
+        self._closers: list[typing.Callable[[], typing.Awaitable]] = []
+
+    @property
+    def shared(self) -> bool:
+        """Whether other processes share the stored state."""
+        return self.shards > 1
+
+    @functools.cached_property
+    def snapshots(self) -> src.snapshot.Snapshots:
+        """The snapshots of the warm state, one file per shard."""
+        path = src.const.SNAPSHOT_PATH
+
+        if path and self.shared:
+            path = f"{path}.{self.shard}"
+
+        return src.snapshot.Snapshots(path, interval=src.const.SNAPSHOT_INTERVAL)
+
+    @functools.cached_property
+    def quota(self) -> src.quota.QuotaLedger:
+        """The ledger of billed characters."""
+        quota = src.quota.QuotaLedger(soft=src.const.QUOTA_SOFT, hard=src.const.QUOTA_HARD)
+        self.snapshots.register("quota", quota.dump, quota.restore)
+        return quota
+
+    @functools.cached_property
+    def cache(self) -> src.cache.TranslationCache:
+        """The cache of translations."""
+        cache = src.cache.TranslationCache(
+            size=src.const.CACHE_SIZE, ttl=src.const.CACHE_TTL, path=src.const.CACHE_PATH
+        )
+        self.snapshots.register("cache", cache.dump, cache.restore)
+        return cache
+
+    @functools.cached_property
+    def translator(self) -> src.translator.AsyncTranslator:
+        """The one translator, and so the one pool of connections, to DeepL."""
+        return src.translator.AsyncTranslator(
+            src.const.AUTH_KEY,
+            concurrency=src.const.CONCURRENCY,
+            timeout=src.const.TIMEOUT,
+            cache=self.cache,
+            ledger=self.quota,
+            server_url=src.const.SERVER_URL,
+            scheduler=self.scheduler,
+        )
+
+    @functools.cached_property
+    def scheduler(self) -> src.scheduler.Scheduler:
+        """The scheduler every translation waits its turn in."""
+        return src.scheduler.Scheduler(
+            rate=src.const.SCHEDULER_RATE,
+            burst=src.const.SCHEDULER_BURST,
+            queue=src.const.SCHEDULER_QUEUE,
+        )
+
+    def on_close(self, close: typing.Callable[[], typing.Awaitable]):
+        """Adds something to close, like an extension's state, before the services themselves."""
+        self._closers.append(close)
+
+    def start(self):
+        """Starts reconciling the quota and writing snapshots on the running loop."""
+        self.quota.start(self.translator)
+        self.snapshots.start()
+
+    async def close(self):
+        """Stops and closes whichever services were built, snapshotting them first."""
+        if "snapshots" in self.__dict__:
+            self.snapshots.close()
+
+        while self._closers:
+            await self._closers.pop()()
+
+        if "scheduler" in self.__dict__:
+            self.scheduler.close()
+        if "quota" in self.__dict__:
+            self.quota.close()
+        if "translator" in self.__dict__:
+            await self.translator.close()
+        elif "cache" in self.__dict__:
+            self.cache.close()
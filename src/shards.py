@@ -0,0 +1,211 @@
+"""
+The bot's shard launcher. This runs one bot process per gateway
+shard, restarts any that die, and reports how each one is doing.
+
+Run it from ``src/`` in place of ``bot.py``, with ``STORAGE="sqlite"``
+so every shard shares the same preferences.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import sqlite3
+import sys
+import time
+
+sys.path.append("..")
+
+import src.const
+
+log = logging.getLogger(__name__)
+
+
+def parse(argv: list[str]) -> tuple[int, int]:
+    """Gets the ``--shard`` and ``--shards`` a bot process was started with, if any."""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--shard", type=int, default=0)
+    parser.add_argument("--shards", type=int, default=1)
+    args, _ = parser.parse_known_args(argv)
+    return args.shard, args.shards
+
+
+class Health:
+    """
+    The health table of the shards, shared through the database.
+
+    Every bot process writes its shard's latency and guild count to
+    ``shards`` every ``interval`` seconds, and the launcher reads them
+    back. A shard that has not written for three intervals is stale.
+    """
+
+    def __init__(self, path: str = "./db/disword.sqlite3", interval: float = 15.0):
+        self.path = path
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS shards ("
+            "shard_id INTEGER PRIMARY KEY, pid INTEGER, latency REAL, guilds INTEGER, "
+            "updated REAL)"
+        )
+        self._db.commit()
+
+    def report(self, shard_id: int, latency: float, guilds: int):
+        """Writes how a shard is doing."""
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO shards VALUES (?, ?, ?, ?, ?)",
+                (shard_id, os.getpid(), latency, guilds, time.time()),
+            )
+
+    def read(self) -> dict[int, tuple[int, float, int, float]]:
+        """Gets the last ``(pid, latency, guilds, updated)`` written by every shard."""
+        return {
+            shard_id: rest
+            for shard_id, *rest in self._db.execute(
+                "SELECT shard_id, pid, latency, guilds, updated FROM shards"
+            )
+        }
+
+    def stale(self, updated: float) -> bool:
+        return updated < time.time() - 3 * self.interval
+
+    async def _heartbeat(self, bot, shard_id: int):
+        while True:
+            try:
+                await asyncio.to_thread(self.report, shard_id, bot.latency, len(bot.guilds))
+            except sqlite3.Error:
+                log.exception(f"Could not report the health of shard {shard_id}.")
+
+            await asyncio.sleep(self.interval)
+
+    def start(self, bot, shard_id: int):
+        """Starts reporting a bot's health on the running loop, if not already started."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._heartbeat(bot, shard_id))
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        self._db.close()
+
+
+class Launcher:
+    """
+    Runs ``shards`` bot processes, one per gateway shard.
+
+    A process that exits is started again after ``backoff`` seconds,
+    doubling up to ``max_backoff`` each time it exits within a minute of
+    starting and resetting once it stays up longer, and the health of
+    every shard is logged every ``interval`` seconds.
+    """
+
+    def __init__(
+        self,
+        shards: int,
+        health: Health,
+        args: list[str],
+        backoff: float = 5.0,
+        max_backoff: float = 300.0,
+    ):
+        self.shards = shards
+        self.health = health
+        self.args = args
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._processes: dict[int, asyncio.subprocess.Process] = {}
+        self._closing = False
+
+    async def _run(self, shard_id: int):
+        backoff = self.backoff
+
+        while not self._closing:
+            started = time.monotonic()
+            process = await asyncio.create_subprocess_exec(
+                sys.executable,
+                "bot.py",
+                "--shard",
+                str(shard_id),
+                "--shards",
+                str(self.shards),
+                *self.args,
+            )
+            self._processes[shard_id] = process
+            log.info(f"Started shard {shard_id}/{self.shards} as process {process.pid}.")
+            code = await process.wait()
+
+            if self._closing:
+                break
+
+            if time.monotonic() - started < 60:
+                backoff = min(backoff * 2, self.max_backoff)
+            else:
+                backoff = self.backoff
+            log.warning(f"Shard {shard_id} exited with {code}, restarting in {backoff:.0f}s.")
+            await asyncio.sleep(backoff)
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.health.interval)
+            shards = self.health.read()
+
+            for shard_id in range(self.shards):
+                if shard_id not in shards:
+                    log.info(f"Shard {shard_id} has not reported yet.")
+                    continue
+
+                pid, latency, guilds, updated = shards[shard_id]
+
+                if self.health.stale(updated):
+                    silent = time.time() - updated
+                    log.warning(f"Shard {shard_id} has not reported for {silent:.0f}s.")
+                else:
+                    log.info(f"Shard {shard_id}: {latency:.0f}ms, {guilds} guilds (process {pid}).")
+
+    def close(self):
+        """Stops every bot process."""
+        self._closing = True
+
+        for process in self._processes.values():
+            if process.returncode is None:
+                process.terminate()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self.close)
+
+        watcher = loop.create_task(self._watch())
+
+        try:
+            await asyncio.gather(*(self._run(shard_id) for shard_id in range(self.shards)))
+        finally:
+            watcher.cancel()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Runs the bot as one process per shard.")
+    parser.add_argument("--shards", type=int, default=src.const.SHARDS)
+    parser.add_argument("--interval", type=float, default=15.0)
+    args, rest = parser.parse_known_args()
+
+    if args.shards > 1 and src.const.STORAGE != "sqlite":
+        sys.exit('Running more than one shard needs STORAGE="sqlite" to share preferences.')
+
+    health = Health(src.const.DATABASE, args.interval)
+
+    try:
+        asyncio.run(Launcher(args.shards, health, rest).run())
+    finally:
+        health.close()
+
+
+if __name__ == "__main__":
+    main()
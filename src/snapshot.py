@@ -0,0 +1,212 @@
+"""
+The bot's warm-restart snapshots. This writes what the bot has
+warmed up in memory to a compact binary file, and reads it back
+on startup one segment at a time, only when it is first needed.
+"""
+import asyncio
+import atexit
+import functools
+import importlib.util
+import logging
+import marshal
+import mmap
+import os
+import struct
+import tempfile
+import time
+import typing
+import zlib
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"DWSNAP\x00\x01"
+# the magic, the version of marshal's format, the number of segments and when it was written.
+HEADER = struct.Struct("<8s4sId")
+# the name, offset and length of a segment.
+ENTRY = struct.Struct("<16sQQ")
+
+# a function that decodes a segment of the last snapshot, if it has one.
+Loader = typing.Callable[[], typing.Any]
+
+
+def write(path: str, segments: dict[str, typing.Any]):
+    """
+    Writes segments to a snapshot file, replacing it at once.
+
+    Every segment is marshalled and compressed on its own, so each one
+    can be decoded without touching the rest. The file is only readable
+    by the user running the bot.
+    """
+    blobs = [
+        (name.encode(), zlib.compress(marshal.dumps(value), 1)) for name, value in segments.items()
+    ]
+    offset = HEADER.size + ENTRY.size * len(blobs)
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    # a file of its own, readable only by the bot since it holds webhook tokens,
+    # so a periodic write and the one at exit never write over each other.
+    fd, temporary = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", dir=directory)
+
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(HEADER.pack(MAGIC, importlib.util.MAGIC_NUMBER, len(blobs), time.time()))
+
+            for name, blob in blobs:
+                file.write(ENTRY.pack(name, offset, len(blob)))
+                offset += len(blob)
+
+            for _, blob in blobs:
+                file.write(blob)
+
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+class Snapshot:
+    """
+    A snapshot file, memory-mapped for reading.
+
+    Opening one only reads its table of segments. A segment is
+    decompressed and unmarshalled when it is asked for.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, version, count, self.created = HEADER.unpack_from(self._mmap)
+
+            # marshal's format changes between versions of Python.
+            if magic != MAGIC or version != importlib.util.MAGIC_NUMBER:
+                raise ValueError("The snapshot was written by another version.")
+
+            self._segments = {
+                name.rstrip(b"\x00").decode(): (offset, length)
+                for name, offset, length in (
+                    ENTRY.unpack_from(self._mmap, HEADER.size + ENTRY.size * index)
+                    for index in range(count)
+                )
+            }
+        except (ValueError, struct.error):
+            self._mmap.close()
+            raise
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._segments
+
+    def get(self, name: str) -> typing.Any:
+        """Decodes a segment."""
+        offset, length = self._segments[name]
+        return marshal.loads(zlib.decompress(self._mmap[offset : offset + length]))
+
+    def close(self):
+        self._mmap.close()
+
+
+class Snapshots:
+    """
+    The warm state of the bot, snapshotted to ``path``.
+
+    Whatever registers a segment gives a function dumping it and,
+    optionally, one restoring it, which is handed a loader to call
+    whenever it first needs the segment. Snapshots are written every
+    ``interval`` seconds and once more when the process exits. Without
+    a ``path``, nothing is read or written.
+    """
+
+    def __init__(self, path: str | None = None, interval: float = 300.0):
+        self.path = path
+        self.interval = interval
+        self._dumps: dict[str, typing.Callable[[], typing.Any]] = {}
+        self._snapshot: Snapshot | None = None
+        self._task: asyncio.Task | None = None
+
+        if path is None:
+            return
+
+        if os.path.exists(path):
+            try:
+                self._snapshot = Snapshot(path)
+            except (OSError, ValueError, struct.error) as error:
+                log.warning(f"Could not open the snapshot at {path}: {error}")
+            else:
+                age = time.time() - self._snapshot.created
+                log.debug(f"Opened a snapshot written {age:.0f}s ago.")
+
+        atexit.register(self.write)
+
+    def register(
+        self,
+        name: str,
+        dump: typing.Callable[[], typing.Any],
+        restore: typing.Callable[[Loader], None] | None = None,
+    ):
+        """Adds a segment to every snapshot, restoring it from the last one if given how."""
+        self._dumps[name] = dump
+
+        if restore is not None:
+            restore(functools.partial(self.load, name))
+
+    def load(self, name: str) -> typing.Any:
+        """Decodes a segment of the last snapshot, or gets ``None`` if it cannot."""
+        if self._snapshot is None or name not in self._snapshot:
+            return None
+
+        try:
+            return self._snapshot.get(name)
+        except (ValueError, EOFError, TypeError, zlib.error) as error:
+            log.warning(f"Could not decode the {name} segment of the snapshot: {error}")
+            return None
+
+    def dump(self) -> dict[str, typing.Any]:
+        """Dumps every segment as it is now."""
+        segments = {}
+
+        for name, dump in self._dumps.items():
+            try:
+                segments[name] = dump()
+            except Exception:
+                log.exception(f"Could not dump the {name} segment of the snapshot.")
+
+        return segments
+
+    def write(self):
+        """Writes a snapshot now, blocking until it is written."""
+        if self.path is not None and self._dumps:
+            write(self.path, self.dump())
+
+    async def _write_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+
+            try:
+                # segments are dumped on the loop, and only encoded and written on a thread.
+                await asyncio.to_thread(write, self.path, self.dump())
+            except OSError:
+                log.exception("Could not write a snapshot.")
+
+    def start(self):
+        """Starts writing snapshots on the running loop, if not already started."""
+        if self.path is not None and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._write_loop())
+
+    def close(self):
+        """Stops writing snapshots, writes one last one and closes the last one read."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        if self.path is not None:
+            atexit.unregister(self.write)
+
+            try:
+                self.write()
+            except OSError:
+                log.exception("Could not write a snapshot.")
+
+        if self._snapshot is not None:
+            self._snapshot.close()
+            self._snapshot = None
@@ -0,0 +1,571 @@
+"""
+The bot's preference store. This keeps translation preferences
+and channel webhooks in memory, and writes them back to our
+databases in batches.
+"""
+import asyncio
+import atexit
+import concurrent.futures
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import typing
+
+import attrs
+
+import src.model
+
+log = logging.getLogger(__name__)
+
+# the changes to save: a row of ``TranslationUser`` fields, a webhook ID or the
+# languages a channel is subscribed to for each changed key, or ``None`` for
+# each removed one.
+UserChanges = dict[int, tuple | None]
+ChannelChanges = dict[int, int | None]
+SubscriptionChanges = dict[int, tuple[str, ...] | None]
+Loaded = tuple[list[src.model.TranslationUser], dict[int, int], dict[int, tuple[str, ...]]]
+
+
+def _atomic_dump(path: str, data: dict):
+    """Writes a JSON document to a path without ever leaving it half-written."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=4, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _load(path: str) -> dict:
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+class Backend:
+    """The interface a storage backend of the preference store implements."""
+
+    shared: bool = False
+    """Whether other processes save to the same backend, and so may change it under us."""
+
+    def load(self) -> Loaded:
+        """Loads every user, every channel's webhook ID and every channel's subscription."""
+        raise NotImplementedError
+
+    def save(
+        self,
+        users: UserChanges,
+        channels: ChannelChanges,
+        subscriptions: SubscriptionChanges | None = None,
+    ):
+        """Saves the changes to users, channels and subscriptions at once."""
+        raise NotImplementedError
+
+    def changes(self, since: int) -> tuple[int, list[tuple[str, int]]]:
+        """
+        Gets the keys other processes saved since a change number, as ``(kind, key)``,
+        with the number of the last change. A negative number gets only the latter.
+        """
+        return max(since, 0), []
+
+    def fetch(self, kind: str, keys: list[int]) -> dict:
+        """Loads the current values of some ``user``, ``channel`` or ``subscription`` keys."""
+        raise NotImplementedError
+
+    def close(self):
+        """Releases whatever the backend holds on to."""
+
+
+class JSONBackend(Backend):
+    """
+    A backend of the JSON files ``translation.json``, ``guilds.json`` and
+    ``subscriptions.json``.
+
+    Every save rewrites whichever file has changed as a whole, atomically.
+    """
+
+    def __init__(
+        self,
+        users_path: str = "./db/translation.json",
+        channels_path: str = "./db/guilds.json",
+        subscriptions_path: str = "./db/subscriptions.json",
+    ):
+        self.users_path = users_path
+        self.channels_path = channels_path
+        self.subscriptions_path = subscriptions_path
+        self._users: dict[str, dict] = {}
+        self._channels: dict[str, str] = {}
+        self._subscriptions: dict[str, list[str]] = {}
+
+    def load(self) -> Loaded:
+        self._users = _load(self.users_path)
+        self._channels = _load(self.channels_path)
+        self._subscriptions = _load(self.subscriptions_path)
+        users = [
+            src.model.TranslationUser(
+                id=int(id), language=data["language"], automatic=data.get("automatic", True)
+            )
+            for id, data in self._users.items()
+        ]
+        channels = {
+            int(channel_id): int(webhook_id)
+            for channel_id, webhook_id in self._channels.items()
+            if webhook_id
+        }
+        subscriptions = {
+            int(channel_id): tuple(languages)
+            for channel_id, languages in self._subscriptions.items()
+            if languages
+        }
+        return users, channels, subscriptions
+
+    def save(
+        self,
+        users: UserChanges,
+        channels: ChannelChanges,
+        subscriptions: SubscriptionChanges | None = None,
+    ):
+        for id, row in users.items():
+            if row is None:
+                self._users.pop(str(id), None)
+            else:
+                self._users[str(id)] = attrs.asdict(src.model.TranslationUser(*row))
+        for channel_id, webhook_id in channels.items():
+            if webhook_id is None:
+                self._channels.pop(str(channel_id), None)
+            else:
+                self._channels[str(channel_id)] = str(webhook_id)
+        for channel_id, languages in (subscriptions or {}).items():
+            if languages:
+                self._subscriptions[str(channel_id)] = list(languages)
+            else:
+                self._subscriptions.pop(str(channel_id), None)
+
+        if users:
+            _atomic_dump(self.users_path, self._users)
+        if channels:
+            _atomic_dump(self.channels_path, self._channels)
+        if subscriptions:
+            _atomic_dump(self.subscriptions_path, self._subscriptions)
+
+
+class SQLiteBackend(Backend):
+    """
+    A backend of an SQLite database in WAL mode.
+
+    The ``users`` table has one column per field of ``TranslationUser`` and
+    ``channels`` maps a channel to its webhook, both keyed by snowflake.
+    ``subscriptions`` has a row per language each channel is subscribed to.
+    Every save is a single transaction of only the rows that changed.
+
+    When ``shared`` by several processes, every save also logs the keys it
+    changed to ``changes``, which the others poll to refresh those keys.
+    """
+
+    USERS = "INSERT OR REPLACE INTO users (id, language, automatic) VALUES (?, ?, ?)"
+    CHANNELS = "INSERT OR REPLACE INTO channels (channel_id, webhook_id) VALUES (?, ?)"
+
+    KEEP = 10000
+
+    def __init__(self, path: str = "./db/disword.sqlite3", shared: bool = False):
+        self.path = path
+        self.shared = shared
+        self.origin = os.getpid()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY,
+                language TEXT NOT NULL,
+                automatic INTEGER NOT NULL DEFAULT 1
+            );
+            CREATE TABLE IF NOT EXISTS channels (
+                channel_id INTEGER PRIMARY KEY,
+                webhook_id INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS subscriptions (
+                channel_id INTEGER NOT NULL,
+                language TEXT NOT NULL,
+                PRIMARY KEY (channel_id, language)
+            );
+            CREATE TABLE IF NOT EXISTS changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                key INTEGER NOT NULL,
+                origin INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS users_automatic ON users (automatic);
+            """
+        )
+
+    def load(self) -> Loaded:
+        users = [
+            src.model.TranslationUser(id, language, bool(automatic))
+            for id, language, automatic in self._db.execute(
+                "SELECT id, language, automatic FROM users"
+            )
+        ]
+        channels = dict(self._db.execute("SELECT channel_id, webhook_id FROM channels"))
+        subscriptions: dict[int, tuple[str, ...]] = {}
+
+        for channel_id, language in self._db.execute(
+            "SELECT channel_id, language FROM subscriptions ORDER BY rowid"
+        ):
+            subscriptions[channel_id] = subscriptions.get(channel_id, ()) + (language,)
+
+        return users, channels, subscriptions
+
+    def save(
+        self,
+        users: UserChanges,
+        channels: ChannelChanges,
+        subscriptions: SubscriptionChanges | None = None,
+    ):
+        subscriptions = subscriptions or {}
+
+        with self._db:
+            self._db.executemany(self.USERS, [row for row in users.values() if row is not None])
+            self._db.executemany(
+                "DELETE FROM users WHERE id = ?",
+                [(id,) for id, row in users.items() if row is None],
+            )
+            self._db.executemany(
+                self.CHANNELS,
+                [
+                    (channel_id, webhook_id)
+                    for channel_id, webhook_id in channels.items()
+                    if webhook_id is not None
+                ],
+            )
+            self._db.executemany(
+                "DELETE FROM channels WHERE channel_id = ?",
+                [(id,) for id, webhook_id in channels.items() if webhook_id is None],
+            )
+            self._db.executemany(
+                "DELETE FROM subscriptions WHERE channel_id = ?",
+                [(channel_id,) for channel_id in subscriptions],
+            )
+            self._db.executemany(
+                "INSERT INTO subscriptions (channel_id, language) VALUES (?, ?)",
+                [
+                    (channel_id, language)
+                    for channel_id, languages in subscriptions.items()
+                    for language in languages or ()
+                ],
+            )
+
+            if self.shared:
+                self._db.executemany(
+                    "INSERT INTO changes (kind, key, origin) VALUES (?, ?, ?)",
+                    [("user", id, self.origin) for id in users]
+                    + [("channel", id, self.origin) for id in channels]
+                    + [("subscription", id, self.origin) for id in subscriptions],
+                )
+                self._db.execute(
+                    "DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - ?",
+                    (self.KEEP,),
+                )
+
+    def changes(self, since: int) -> tuple[int, list[tuple[str, int]]]:
+        if not self.shared:
+            return max(since, 0), []
+        if since < 0:
+            return self._db.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0], []
+
+        rows = self._db.execute(
+            "SELECT seq, kind, key, origin FROM changes WHERE seq > ? ORDER BY seq", (since,)
+        ).fetchall()
+        last = rows[-1][0] if rows else since
+        return last, list(
+            dict.fromkeys((kind, key) for _, kind, key, origin in rows if origin != self.origin)
+        )
+
+    def fetch(self, kind: str, keys: list[int]) -> dict:
+        marks = ", ".join("?" * len(keys))
+
+        if kind == "user":
+            found = {
+                row[0]: row
+                for row in self._db.execute(
+                    f"SELECT id, language, automatic FROM users WHERE id IN ({marks})", keys
+                )
+            }
+        elif kind == "channel":
+            found = dict(
+                self._db.execute(
+                    f"SELECT channel_id, webhook_id FROM channels WHERE channel_id IN ({marks})",
+                    keys,
+                )
+            )
+        else:
+            found = {}
+
+            for channel_id, language in self._db.execute(
+                f"SELECT channel_id, language FROM subscriptions WHERE channel_id IN ({marks}) "
+                "ORDER BY rowid",
+                keys,
+            ):
+                found[channel_id] = found.get(channel_id, ()) + (language,)
+
+        return {key: found.get(key) for key in keys}
+
+    def close(self):
+        self._db.close()
+
+
+class PreferenceStore:
+    """
+    An in-memory store of translation preferences, channel webhooks and
+    channel subscriptions.
+
+    Everything is loaded once from the backend, and lookups never touch
+    the disk. Changes are remembered per key and saved by a write-behind
+    task every ``interval`` seconds, and once more when the process exits.
+
+    When the backend is shared with other processes, changes are saved as
+    soon as they are made, and what the others save is polled for every
+    ``poll`` seconds and reloaded, unless we have unsaved changes of our own.
+    """
+
+    def __init__(self, backend: Backend | None = None, interval: float = 5.0, poll: float = 1.0):
+        self.backend = backend or JSONBackend()
+        self.interval = interval
+        self.poll = poll
+        self._seq = 0
+        self._wakeup = asyncio.Event()
+        self._users: dict[int, src.model.TranslationUser] = {}
+        self._active: set[int] = set()
+        self._channels: dict[int, int] = {}
+        self._subscriptions: dict[int, tuple[str, ...]] = {}
+        self._dirty_users: set[int] = set()
+        self._dirty_channels: set[int] = set()
+        self._dirty_subscriptions: set[int] = set()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="store"
+        )
+        self._task: asyncio.Task | None = None
+        self._poller: asyncio.Task | None = None
+        self.load()
+        atexit.register(self.flush)
+
+    def load(self):
+        """Loads the databases from the backend, replacing what is in memory."""
+        self._seq, _ = self.backend.changes(-1)
+        users, self._channels, self._subscriptions = self.backend.load()
+        self._users = {user.id: user for user in users}
+        self._active = {id for id, user in self._users.items() if user.automatic}
+        self._dirty_users.clear()
+        self._dirty_channels.clear()
+        self._dirty_subscriptions.clear()
+        log.debug(
+            f"Loaded {len(self._users)} users, {len(self._channels)} channels "
+            f"and {len(self._subscriptions)} subscriptions."
+        )
+
+    def is_active(self, id: int) -> bool:
+        """Checks whether a user has automatic translation enabled."""
+        return id in self._active
+
+    def get_user(self, id: int) -> src.model.TranslationUser | None:
+        """Gets the translation preferences of a user, if any."""
+        return self._users.get(id)
+
+    def set_user(self, user: src.model.TranslationUser):
+        """Sets the translation preferences of a user."""
+        self._users[user.id] = user
+
+        if user.automatic:
+            self._active.add(user.id)
+        else:
+            self._active.discard(user.id)
+
+        self._dirty_users.add(user.id)
+        self._changed()
+
+    def get_webhook(self, channel_id: int) -> int | None:
+        """Gets the ID of the webhook saved for a channel, if any."""
+        return self._channels.get(channel_id)
+
+    def channels(self) -> list[int]:
+        """Gets every channel with a saved webhook."""
+        return list(self._channels)
+
+    def set_webhook(self, channel_id: int, webhook_id: int | None):
+        """Saves or, with ``None``, forgets the webhook of a channel."""
+        if webhook_id is None:
+            if self._channels.pop(channel_id, None) is None:
+                return
+        elif self._channels.get(channel_id) == webhook_id:
+            return
+        else:
+            self._channels[channel_id] = webhook_id
+
+        self._dirty_channels.add(channel_id)
+        self._changed()
+
+    def get_languages(self, channel_id: int) -> tuple[str, ...]:
+        """Gets the languages a channel is subscribed to, if any."""
+        return self._subscriptions.get(channel_id, ())
+
+    def set_languages(self, channel_id: int, languages: typing.Iterable[str]):
+        """Subscribes a channel to some languages, or unsubscribes it with none."""
+        if languages := tuple(dict.fromkeys(languages)):
+            self._subscriptions[channel_id] = languages
+        elif self._subscriptions.pop(channel_id, None) is None:
+            return
+
+        self._dirty_subscriptions.add(channel_id)
+        self._changed()
+
+    def _changed(self):
+        # other processes only see a change once it is saved, so it is saved right away.
+        if self.backend.shared:
+            self._wakeup.set()
+
+    def _changes(
+        self, clear: bool = True
+    ) -> tuple[UserChanges, ChannelChanges, SubscriptionChanges]:
+        """Takes a copy of every change, marking the store as clean unless told not to."""
+        users: UserChanges = {
+            id: attrs.astuple(user) if (user := self._users.get(id)) else None
+            for id in self._dirty_users
+        }
+        channels: ChannelChanges = {id: self._channels.get(id) for id in self._dirty_channels}
+        subscriptions: SubscriptionChanges = {
+            id: self._subscriptions.get(id) for id in self._dirty_subscriptions
+        }
+
+        if clear:
+            self._dirty_users.clear()
+            self._dirty_channels.clear()
+            self._dirty_subscriptions.clear()
+
+        return users, channels, subscriptions
+
+    def flush(self):
+        """
+        Saves every change to the backend on the calling thread.
+
+        This never goes through the executor, which no longer takes work
+        once the interpreter is exiting, and the store is only marked clean
+        once the save succeeded.
+        """
+        changes = self._changes(clear=False)
+
+        if any(changes):
+            self.backend.save(*changes)
+            self._dirty_users.clear()
+            self._dirty_channels.clear()
+            self._dirty_subscriptions.clear()
+
+    async def _write_behind(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self._wakeup.clear()
+
+            if not self._dirty_users and not self._dirty_channels and not self._dirty_subscriptions:
+                continue
+
+            # the copies are taken on the loop, so only the disk I/O leaves it.
+            users, channels, subscriptions = self._changes()
+
+            try:
+                await loop.run_in_executor(
+                    self._executor, self.backend.save, users, channels, subscriptions
+                )
+            except (OSError, sqlite3.Error):
+                log.exception("Could not flush the preference store.")
+                self._dirty_users.update(users)
+                self._dirty_channels.update(channels)
+                self._dirty_subscriptions.update(subscriptions)
+
+    def _apply(self, kind: str, values: dict):
+        for key, value in values.items():
+            if kind == "user" and key not in self._dirty_users:
+                if value is None:
+                    self._users.pop(key, None)
+                    self._active.discard(key)
+                else:
+                    user = src.model.TranslationUser(key, value[1], bool(value[2]))
+                    self._users[key] = user
+
+                    if user.automatic:
+                        self._active.add(key)
+                    else:
+                        self._active.discard(key)
+            elif kind == "channel" and key not in self._dirty_channels:
+                if value is None:
+                    self._channels.pop(key, None)
+                else:
+                    self._channels[key] = value
+            elif kind == "subscription" and key not in self._dirty_subscriptions:
+                if value is None:
+                    self._subscriptions.pop(key, None)
+                else:
+                    self._subscriptions[key] = value
+
+    def _refresh(self) -> tuple[int, dict[str, dict]]:
+        seq, changes = self.backend.changes(self._seq)
+        keys: dict[str, list[int]] = {}
+
+        for kind, key in changes:
+            keys.setdefault(kind, []).append(key)
+
+        return seq, {kind: self.backend.fetch(kind, ids) for kind, ids in keys.items()}
+
+    async def _poll(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            await asyncio.sleep(self.poll)
+
+            try:
+                self._seq, changes = await loop.run_in_executor(self._executor, self._refresh)
+            except sqlite3.Error:
+                log.exception("Could not poll the preference store for changes.")
+                continue
+
+            for kind, values in changes.items():
+                self._apply(kind, values)
+                log.debug(f"Reloaded {len(values)} {kind} keys changed by another process.")
+
+    def start(self):
+        """Starts the write-behind task on the running loop, if not already started."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._write_behind())
+        if self.backend.shared and (self._poller is None or self._poller.done()):
+            self._poller = asyncio.get_running_loop().create_task(self._poll())
+
+    async def close(self):
+        """Stops the write-behind task, flushes whatever is left and closes the backend."""
+        for task in (self._task, self._poller):
+            if task is not None:
+                task.cancel()
+
+        self._task = self._poller = None
+
+        # a save already running has to finish before the last one starts.
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+        atexit.unregister(self.flush)
+        self.flush()
+        self.backend.close()
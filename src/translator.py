@@ -0,0 +1,198 @@
+"""
+The bot's translation backend. This runs the DeepL SDK off
+the event loop so translations never block the gateway.
+"""
+import asyncio
+import concurrent.futures
+import functools
+import inspect
+import logging
+
+import aiohttp
+import deepl
+
+import src.cache
+import src.markup
+import src.quota
+import src.scheduler
+
+log = logging.getLogger(__name__)
+
+# SDKs since 1.20 also count the characters each result was billed for.
+_BILLED = "billed_characters" in inspect.signature(deepl.TextResult).parameters
+
+
+# the options cached translations may be made with. Every text the bot
+# translates is segmented the same way, so the markup options never vary.
+_CACHED = {"target_lang", "formality", *src.markup.OPTIONS}
+
+
+def _cached(text: str, detected_source_lang: str) -> deepl.TextResult:
+    """Makes the result of a cached translation, which bills nothing."""
+    if _BILLED:
+        return deepl.TextResult(text, detected_source_lang, billed_characters=0)
+
+    result = deepl.TextResult(text, detected_source_lang)
+    result.billed_characters = 0
+    return result
+
+
+def _billed(results: list[deepl.TextResult], texts: list[str]):
+    """Counts what results were billed for on SDKs that do not, as the length of their text."""
+    if not _BILLED:
+        for result, text in zip(results, texts):
+            result.billed_characters = len(text)
+
+
+class AsyncTranslator:
+    """
+    An awaitable wrapper around ``deepl.Translator``.
+
+    Blocking SDK calls run on a bounded thread pool of ``concurrency``
+    workers, so at most that many requests are in flight and the rest
+    wait their turn without holding up the loop. Every call is bound by
+    ``timeout`` seconds, and cancelling the awaiting coroutine drops the
+    call if it has not started yet. The SDK client and its connections
+    are only set up once the first call is made.
+
+    When a ``cache`` is given, plain text translations are answered from
+    it first and only the missing texts are sent to the API. When a
+    ``ledger`` is given, the characters sent are billed to it. When a
+    ``scheduler`` is given, every request waits for a token from it.
+    """
+
+    def __init__(
+        self,
+        auth_key: str,
+        concurrency: int = 8,
+        timeout: float = 10.0,
+        cache: src.cache.TranslationCache | None = None,
+        ledger: src.quota.QuotaLedger | None = None,
+        server_url: str | None = None,
+        scheduler: src.scheduler.Scheduler | None = None,
+    ):
+        self.auth_key = auth_key
+        self.server_url = server_url
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.cache = cache
+        self.ledger = ledger
+        self.scheduler = scheduler
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="deepl"
+        )
+        self._session: aiohttp.ClientSession | None = None
+
+    @functools.cached_property
+    def translator(self) -> deepl.Translator:
+        """The SDK client every call goes through."""
+        return deepl.Translator(self.auth_key, server_url=self.server_url)
+
+    async def _run(self, func, *args, timeout: float | None = None, **kwargs):
+        if self.scheduler is not None:
+            await self.scheduler.acquire()
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+        return await asyncio.wait_for(future, timeout or self.timeout)
+
+    def _bill(self, texts):
+        if self.ledger is not None:
+            self.ledger.bill(sum(len(text) for text in texts))
+
+    async def translate_text(
+        self, text: str | list[str], *, timeout: float | None = None, **kwargs
+    ) -> deepl.TextResult | list[deepl.TextResult]:
+        """Translates text, taking the same options as ``deepl.Translator.translate_text``."""
+        if self.cache is None or set(kwargs) - _CACHED:
+            self._bill([text] if isinstance(text, str) else text)
+            return await self._run(self.translator.translate_text, text, timeout=timeout, **kwargs)
+
+        texts: list[str] = [text] if isinstance(text, str) else list(text)
+        keys = [
+            src.cache.make_key(_text, kwargs["target_lang"], kwargs.get("formality"))
+            for _text in texts
+        ]
+        found: dict[src.cache.Key, deepl.TextResult] = {}
+        missing: dict[src.cache.Key, str] = {}
+
+        for key, _text in zip(keys, texts):
+            if key in found or key in missing:
+                continue
+            if (result := await self.cache.get(key)) is not None:
+                found[key] = _cached(*result)
+            else:
+                missing[key] = _text
+
+        if missing:
+            self._bill(missing.values())
+            results = await self._run(
+                self.translator.translate_text, list(missing.values()), timeout=timeout, **kwargs
+            )
+            _billed(results, list(missing.values()))
+
+            for key, result in zip(missing, results):
+                self.cache.put(key, result.text, result.detected_source_lang)
+                found[key] = result
+
+        results = [found[key] for key in keys]
+        return results[0] if isinstance(text, str) else results
+
+    async def get_usage(self, *, timeout: float | None = None) -> deepl.Usage:
+        """Gets the usage of the API key."""
+        return await self._run(self.translator.get_usage, timeout=timeout)
+
+    async def get_target_languages(self, *, timeout: float | None = None) -> list[deepl.Language]:
+        """Gets the languages that can be translated to."""
+        return await self._run(self.translator.get_target_languages, timeout=timeout)
+
+    async def translate_document_upload(
+        self, document, *, timeout: float | None = None, **kwargs
+    ) -> deepl.DocumentHandle:
+        """Uploads a document to be translated, returning the handle to poll it with."""
+        return await self._run(
+            self.translator.translate_document_upload, document, timeout=timeout, **kwargs
+        )
+
+    async def translate_document_get_status(
+        self, handle: deepl.DocumentHandle, *, timeout: float | None = None
+    ) -> deepl.DocumentStatus:
+        """Gets the status of a document being translated."""
+        return await self._run(
+            self.translator.translate_document_get_status, handle, timeout=timeout
+        )
+
+    async def translate_document_download(
+        self, handle: deepl.DocumentHandle, output, *, timeout: float | None = None
+    ):
+        """Streams a translated document into a file object."""
+        await self._run(
+            self.translator.translate_document_download, handle, output, timeout=timeout
+        )
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """The pooled HTTP session used for downloads."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency)
+            )
+
+        return self._session
+
+    async def download(self, url: str, *, timeout: float | None = None) -> bytes:
+        """Downloads a file, reusing pooled keep-alive connections."""
+        async with self.session.get(
+            url, timeout=aiohttp.ClientTimeout(total=timeout or self.timeout)
+        ) as response:
+            response.raise_for_status()
+            return await response.read()
+
+    async def close(self):
+        """Closes the pooled connections and stops the worker threads."""
+        if self._session is not None:
+            await self._session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+        self._executor.shutdown(wait=False, cancel_futures=True)
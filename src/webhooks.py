@@ -0,0 +1,267 @@
+"""
+The bot's webhook pool. This keeps one reusable webhook per
+channel for mimicked and automatic translations.
+"""
+import asyncio
+import logging
+import time
+import typing
+
+import attrs
+import interactions as i
+from interactions.client.models.component import _build_components
+
+import src.metrics
+import src.store
+
+log = logging.getLogger(__name__)
+
+NAME = "Disword"
+LEGACY_NAMES = (NAME, "Disword mimicked translation")
+UNKNOWN_WEBHOOK = 10015
+
+
+@attrs.define()
+class PooledWebhook:
+    """Represents a webhook held by the pool for a channel."""
+
+    webhook: i.Webhook = attrs.field()
+    """The webhook, including its token."""
+    last_used: float = attrs.field(factory=time.monotonic)
+    """When the webhook was last handed out."""
+    data: dict = attrs.field(factory=dict)
+    """The webhook as Discord sent it, kept for snapshots."""
+
+
+class WebhookPool:
+    """
+    A pool of one "Disword" webhook per channel.
+
+    Webhooks are discovered from what is saved in the preference store
+    or already in the channel before any is created, and are cached with
+    their token so executing them costs a single REST call. A webhook is
+    only recreated once Discord reports it as missing, and channels that
+    have not been used for ``idle`` seconds are dropped from memory.
+
+    Webhooks restored from a snapshot are pooled without any REST call
+    the first time their channel asks for one. When the bot runs as
+    ``shard`` of ``shards``, only the channels of the guilds that shard
+    serves are discovered ahead of time.
+    """
+
+    def __init__(
+        self,
+        bot: i.Client,
+        store: src.store.PreferenceStore,
+        idle: float = 3600.0,
+        shard: int = 0,
+        shards: int = 1,
+    ):
+        self.bot = bot
+        self.store = store
+        self.idle = idle
+        self.shard = shard
+        self.shards = shards
+        self._webhooks: dict[int, PooledWebhook] = {}
+        self._locks: dict[int, asyncio.Lock] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._pending: typing.Callable[[], dict | None] | None = None
+        self._restored: dict[int, dict] = {}
+
+    def __len__(self) -> int:
+        return len(self._webhooks)
+
+    def _pool(self, channel_id: int, data: dict) -> i.Webhook:
+        webhook = i.Webhook(**data, _client=self.bot._http)
+        self._webhooks[channel_id] = PooledWebhook(webhook, data=data)
+        self.store.set_webhook(channel_id, int(webhook.id))
+        return webhook
+
+    async def _fetch(self, channel_id: int) -> i.Webhook:
+        with src.metrics.DISCORD_SECONDS.time(call="fetch_webhook"):
+            return await self._discover(channel_id)
+
+    async def _discover(self, channel_id: int) -> i.Webhook:
+        if webhook_id := self.store.get_webhook(channel_id):
+            try:
+                data = await self.bot._http.get_webhook(webhook_id)
+            except i.LibraryException as error:
+                if error.code != UNKNOWN_WEBHOOK:
+                    raise
+                self.store.set_webhook(channel_id, None)
+            else:
+                if data.get("token"):
+                    return self._pool(channel_id, data)
+
+        for data in await self.bot._http.get_channel_webhooks(channel_id):
+            if data.get("name") in LEGACY_NAMES and data.get("token"):
+                return self._pool(channel_id, data)
+
+        log.debug(f"Creating a webhook for channel {channel_id}.")
+        data = await self.bot._http.create_webhook(channel_id, name=NAME)
+        return self._pool(channel_id, data)
+
+    def restore(self, load: typing.Callable[[], dict | None]):
+        """Restores the webhooks of a snapshot, once the pool is first used."""
+        self._pending = load
+
+    def _load(self):
+        if self._pending is not None:
+            load, self._pending = self._pending, None
+            self._restored = load() or {}
+            log.debug(f"Restored {len(self._restored)} webhooks from the snapshot.")
+
+    def _restore(self, channel_id: int) -> dict | None:
+        self._load()
+        data = self._restored.pop(channel_id, None)
+
+        # another process may have replaced the webhook since.
+        if data and int(data["id"]) == self.store.get_webhook(channel_id):
+            return data
+
+        return None
+
+    def dump(self) -> dict[int, dict]:
+        """Dumps every pooled webhook, and those restored but not used yet."""
+        self._load()
+        return self._restored | {
+            channel_id: pooled.data for channel_id, pooled in self._webhooks.items() if pooled.data
+        }
+
+    async def get(self, channel_id: int) -> i.Webhook:
+        """Gets the webhook of a channel, discovering or creating it if needed."""
+        if pooled := self._webhooks.get(channel_id):
+            pooled.last_used = time.monotonic()
+            return pooled.webhook
+
+        if data := self._restore(channel_id):
+            return self._pool(channel_id, data)
+
+        lock = self._locks.setdefault(channel_id, asyncio.Lock())
+
+        async with lock:
+            if pooled := self._webhooks.get(channel_id):
+                return pooled.webhook
+
+            return await self._fetch(channel_id)
+
+    def evict(self, channel_id: int):
+        """Drops the webhook of a channel from memory."""
+        self._webhooks.pop(channel_id, None)
+
+    async def _execute(
+        self,
+        webhook: i.Webhook,
+        content: str,
+        username: str | None = None,
+        avatar_url: str | None = None,
+        components: typing.Any = None,
+    ) -> i.Message:
+        payload = {"content": content}
+
+        if username is not None:
+            payload["username"] = username
+        if avatar_url is not None:
+            payload["avatar_url"] = avatar_url
+        if components:
+            payload["components"] = _build_components(components)
+
+        # without waiting, Discord answers with no content, and so no ID to edit the message by.
+        data = await self.bot._http.execute_webhook(
+            int(webhook.id), webhook.token, payload, wait=True
+        )
+        return i.Message(**data, _client=self.bot._http)
+
+    async def execute(self, channel_id: int, content: str, **kwargs) -> i.Message:
+        """
+        Executes the webhook of a channel, getting the message it sent.
+
+        If Discord no longer knows the webhook, it is recreated and
+        executed once more.
+        """
+        webhook = await self.get(channel_id)
+
+        try:
+            with src.metrics.DISCORD_SECONDS.time(call="execute_webhook"):
+                return await self._execute(webhook, content, **kwargs)
+        except i.LibraryException as error:
+            if error.code != UNKNOWN_WEBHOOK:
+                raise
+
+        self.evict(channel_id)
+        self.store.set_webhook(channel_id, None)
+        webhook = await self.get(channel_id)
+        return await self._execute(webhook, content, **kwargs)
+
+    async def edit(self, channel_id: int, message_id: int, content: str):
+        """Edits the content of a message the webhook of a channel sent."""
+        webhook = await self.get(channel_id)
+
+        with src.metrics.DISCORD_SECONDS.time(call="edit_webhook_message"):
+            await self.bot._http.edit_webhook_message(
+                int(webhook.id), webhook.token, message_id, {"content": content}
+            )
+
+    def _owns(self, channel_id: int) -> bool:
+        """Checks whether the guild of a channel is served by this shard, as far as it knows."""
+        if self.shards == 1:
+            return True
+
+        channel = self.bot._http.cache[i.Channel].get(i.Snowflake(channel_id))
+
+        # Discord routes a guild to the shard its ID maps to.
+        return bool(
+            channel is not None
+            and channel.guild_id is not None
+            and (int(channel.guild_id) >> 22) % self.shards == self.shard
+        )
+
+    async def _settle(self, timeout: float = 30.0):
+        """Waits for the guilds of this shard to be cached, since they arrive after READY."""
+        ready = getattr(self.bot._websocket, "_ready", None) or {}
+        guild_ids = [i.Snowflake(guild["id"]) for guild in ready.get("guilds", ())]
+        guilds = self.bot._http.cache[i.Guild]
+        deadline = time.monotonic() + timeout
+
+        while time.monotonic() < deadline and any(guilds.get(id) is None for id in guild_ids):
+            await asyncio.sleep(1)
+
+    async def _warm(self):
+        if self.shards > 1:
+            await self._settle()
+
+        for channel_id in self.store.channels():
+            if channel_id in self._webhooks or not self._owns(channel_id):
+                continue
+
+            try:
+                await self.get(channel_id)
+            except i.LibraryException:
+                log.debug(f"Could not discover the webhook of channel {channel_id}.")
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self.idle / 2)
+            expired = time.monotonic() - self.idle
+
+            for channel_id, pooled in list(self._webhooks.items()):
+                if pooled.last_used < expired:
+                    del self._webhooks[channel_id]
+
+            # a lock is kept while anyone may wait on it, so only idle channels lose theirs.
+            for channel_id, lock in list(self._locks.items()):
+                if channel_id not in self._webhooks and not lock.locked():
+                    del self._locks[channel_id]
+
+    def start(self):
+        """Starts discovering saved webhooks and evicting idle channels on the running loop."""
+        if not self._tasks:
+            loop = asyncio.get_running_loop()
+            self._tasks = [loop.create_task(self._warm()), loop.create_task(self._sweep())]
+
+    def close(self):
+        """Stops the background tasks of the pool."""
+        for task in self._tasks:
+            task.cancel()
+
+        self._tasks.clear()